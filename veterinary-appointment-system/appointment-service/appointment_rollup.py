@@ -0,0 +1,134 @@
+# appointment-service/appointment_rollup.py
+from sqlalchemy.dialects.postgresql import insert
+
+from db import db
+from models import Appointment, AppointmentDailyRollup
+from session_changes import old_and_new, track_deltas
+
+STATUSES = ('scheduled', 'completed', 'cancelled', 'no-show')
+
+
+class AppointmentRollup:
+    """Mantiene appointment_daily_rollup dentro de la misma transacción que modifica appointments.
+
+    Cada flush calcula cuántas citas entran o salen de cada terna
+    (fecha, veterinario, estado) y aplica los incrementos con un upsert.
+    Las reservas, que se insertan sin pasar por el ORM, llaman a apply
+    directamente. El resumen se mantiene siempre, para que esté al día si
+    se activa más tarde; APPOINTMENT_ROLLUP_ENABLED solo decide si
+    collect_stats lee de él.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('APPOINTMENT_ROLLUP_ENABLED', False)
+
+    def apply(self, connection, deltas):
+        """Suma los incrementos {(fecha, veterinario, estado): n} al resumen diario."""
+        rows = [
+            {'day': day, 'veterinarian_id': vet_id, 'status': status, 'appointment_count': delta}
+            for (day, vet_id, status), delta in deltas.items() if delta
+        ]
+        if not rows:
+            return
+
+        table = AppointmentDailyRollup.__table__
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'veterinarian_id', 'status'],
+            set_={'appointment_count': table.c.appointment_count + stmt.excluded.appointment_count}
+        )
+        connection.execute(stmt)
+
+
+appointment_rollup = AppointmentRollup()
+
+
+def collect_stats(target_date, current_year):
+    """Estadísticas del panel en una sola consulta agregada.
+
+    Agrupa por veterinario y por mes con GROUPING SETS; los totales por
+    estado y los del día salen de las columnas FILTER sumando las filas
+    de veterinario. Lee del resumen diario si está activo y de appointments
+    si no.
+    """
+    if appointment_rollup.enabled:
+        table = AppointmentDailyRollup.__table__
+        day, vet_id, status, weight = table.c.day, table.c.veterinarian_id, table.c.status, \
+            table.c.appointment_count
+    else:
+        table = Appointment.__table__
+        day, vet_id, status, weight = table.c.appointment_date, table.c.veterinarian_id, \
+            db.func.coalesce(table.c.status, 'scheduled'), db.literal_column('1')
+
+    month = db.extract('month', day)
+
+    def total(condition=None):
+        aggregate = db.func.sum(weight)
+        if condition is not None:
+            aggregate = aggregate.filter(condition)
+        return db.func.coalesce(aggregate, 0)
+
+    columns = [
+        db.func.grouping(vet_id).label('by_month'),
+        vet_id.label('veterinarian_id'),
+        month.label('month'),
+        total().label('total'),
+        total(day == target_date).label('today'),
+        total(db.extract('year', day) == current_year).label('this_year'),
+    ] + [total(status == value).label(value) for value in STATUSES]
+
+    rows = db.session.execute(
+        db.select(*columns).select_from(table).group_by(db.func.grouping_sets(vet_id, month))
+    ).all()
+
+    stats = {'today': 0, 'by_veterinarian': {}, 'monthly': {}}
+    stats.update({value: 0 for value in STATUSES})
+
+    for row in rows:
+        if row.by_month:
+            if row.this_year:
+                stats['monthly'][int(row.month)] = row.this_year
+            continue
+
+        if row.total:
+            stats['by_veterinarian'][row.veterinarian_id] = row.total
+        stats['today'] += row.today
+        for value in STATUSES:
+            stats[value] += row._mapping[value]
+
+    return stats
+
+
+def _key(appointment_date, veterinarian_id, status):
+    # La columna tiene 'scheduled' por defecto cuando aún no se ha asignado
+    return appointment_date, veterinarian_id, status or 'scheduled'
+
+
+def _collect_rollup_deltas(session, deltas):
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            deltas[_key(obj.appointment_date, obj.veterinarian_id, obj.status)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            old = [old_and_new(obj, attr)[0] for attr in ('appointment_date', 'veterinarian_id', 'status')]
+            deltas[_key(*old)] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and obj not in session.deleted:
+            changes = [old_and_new(obj, attr) for attr in ('appointment_date', 'veterinarian_id', 'status')]
+            old_key = _key(*[old for old, _ in changes])
+            new_key = _key(*[new for _, new in changes])
+            if old_key != new_key:
+                deltas[old_key] -= 1
+                deltas[new_key] += 1
+
+
+track_deltas('appointment_rollup_deltas', _collect_rollup_deltas,
+             lambda connection, deltas: appointment_rollup.apply(connection, deltas))
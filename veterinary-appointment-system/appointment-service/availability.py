@@ -0,0 +1,174 @@
+# appointment-service/availability.py
+from bisect import insort
+from datetime import time
+
+# Motivos por los que un horario no puede reservarse
+OUTSIDE_HOURS = 'outside_hours'
+OVERLAP = 'overlap'
+FULLY_BOOKED = 'fully_booked'
+
+# Estados de las celdas del calendario
+FREE = 'free'
+BUSY = 'busy'
+BREAK = 'break'
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def merge_intervals(intervals):
+    """Ordena y fusiona intervalos [inicio, fin) solapados o contiguos."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals, removed):
+    """Resta a una lista ordenada de intervalos otra lista de intervalos, en O(n log n)."""
+    removed = merge_intervals(removed)
+    result = []
+    i = 0
+
+    for start, end in intervals:
+        # Saltar los intervalos eliminados que terminan antes de este
+        while i < len(removed) and removed[i][1] <= start:
+            i += 1
+
+        current = start
+        j = i
+        while j < len(removed) and removed[j][0] < end:
+            if removed[j][0] > current:
+                result.append((current, removed[j][0]))
+            current = max(current, removed[j][1])
+            j += 1
+
+        if current < end:
+            result.append((current, end))
+
+    return result
+
+
+class DayPlan:
+    """Agenda de un veterinario para un día, en minutos desde medianoche.
+
+    Parte del horario laboral, le resta el descanso y las citas reservadas y
+    ofrece tanto el listado de huecos como la comprobación de conflictos al
+    crear una cita, para que ambos usen exactamente las mismas reglas.
+    """
+
+    def __init__(self, start, end, breaks=(), slot_step=30, default_duration=30, max_appointments=None):
+        self.start = start
+        self.end = end
+        self.slot_step = slot_step or 30
+        self.default_duration = default_duration or self.slot_step
+        self.max_appointments = max_appointments
+        self.working = subtract_intervals([(start, end)], [b for b in breaks if b[0] < b[1]])
+        self.booked = []
+
+    @classmethod
+    def from_schedule(cls, schedule, appointments=()):
+        """Construye el plan a partir de un StaffSchedule o VeterinarianAvailability
+        y de pares (hora de inicio, duración en minutos) de las citas activas."""
+        breaks = []
+        break_start = getattr(schedule, 'break_start', None)
+        break_end = getattr(schedule, 'break_end', None)
+        if break_start and break_end:
+            breaks.append((to_minutes(break_start), to_minutes(break_end)))
+
+        duration = getattr(schedule, 'appointment_duration', None) or 30
+        plan = cls(
+            to_minutes(schedule.start_time),
+            to_minutes(schedule.end_time),
+            breaks=breaks,
+            slot_step=duration,
+            default_duration=duration,
+            max_appointments=getattr(schedule, 'max_appointments', None)
+        )
+
+        for start_time, duration_minutes in appointments:
+            plan.book(to_minutes(start_time), duration_minutes or plan.default_duration)
+
+        return plan
+
+    def book(self, start, duration):
+        insort(self.booked, (start, start + duration))
+
+    def release(self, start, duration):
+        """Libera una cita reservada antes con book (por ejemplo al cancelarla)."""
+        interval = (start, start + duration)
+        if interval in self.booked:
+            self.booked.remove(interval)
+
+    @property
+    def is_full(self):
+        return self.max_appointments is not None and len(self.booked) >= self.max_appointments
+
+    def free_intervals(self):
+        return subtract_intervals(self.working, self.booked)
+
+    def check(self, start, duration=None):
+        """Devuelve None si el hueco [start, start + duration) es reservable, o el motivo."""
+        end = start + (duration or self.default_duration)
+
+        if not any(w_start <= start and end <= w_end for w_start, w_end in self.working):
+            return OUTSIDE_HOURS
+        if self.is_full:
+            return FULLY_BOOKED
+        if any(b_start < end and start < b_end for b_start, b_end in self.booked):
+            return OVERLAP
+        return None
+
+    def available_slots(self, duration=None):
+        """Inicios de los huecos libres sobre la rejilla del horario (cada slot_step minutos)."""
+        if self.is_full:
+            return []
+
+        duration = duration or self.default_duration
+        step = self.slot_step
+        slots = []
+
+        for free_start, free_end in self.free_intervals():
+            # Primer punto de la rejilla dentro del intervalo libre
+            offset = free_start - self.start
+            slot = self.start + -(-offset // step) * step
+            while slot + duration <= free_end:
+                slots.append(slot)
+                slot += step
+
+        return slots
+
+    def spans(self, granularity):
+        """Estado de la jornada en celdas de granularity minutos, comprimido por tramos.
+
+        Devuelve [[estado, celdas], ...] desde self.start. Una celda es BUSY si
+        se solapa con alguna cita, BREAK si cae fuera del horario de trabajo y
+        FREE en otro caso.
+        """
+        spans = []
+        cell = self.start
+        while cell < self.end:
+            cell_end = min(cell + granularity, self.end)
+            if any(b_start < cell_end and cell < b_end for b_start, b_end in self.booked):
+                state = BUSY
+            elif any(w_start <= cell and cell_end <= w_end for w_start, w_end in self.working):
+                state = FREE
+            else:
+                state = BREAK
+
+            if spans and spans[-1][0] == state:
+                spans[-1][1] += 1
+            else:
+                spans.append([state, 1])
+            cell = cell_end
+
+        return spans
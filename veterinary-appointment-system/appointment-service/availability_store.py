@@ -0,0 +1,155 @@
+# appointment-service/availability_store.py
+from datetime import timedelta
+
+from sqlalchemy import tuple_
+
+from availability import DayPlan
+from models import Appointment, StaffSchedule, VeterinarianAvailability
+
+
+def get_day_schedule(veterinarian_id, day):
+    """Horario del veterinario para ese día: StaffSchedule y, si no existe, VeterinarianAvailability."""
+    day_of_week = day.weekday()
+
+    schedule = StaffSchedule.query.filter_by(staff_id=veterinarian_id, day_of_week=day_of_week).first()
+    if schedule:
+        return schedule if schedule.is_available else None
+
+    return VeterinarianAvailability.query.filter_by(
+        veterinarian_id=veterinarian_id,
+        day_of_week=day_of_week,
+        is_available=True
+    ).first()
+
+
+def load_day_plan(veterinarian_id, day):
+    """DayPlan del veterinario para una fecha, o None si no trabaja ese día."""
+    schedule = get_day_schedule(veterinarian_id, day)
+    if not schedule:
+        return None
+
+    appointments = Appointment.query.with_entities(Appointment.appointment_time, Appointment.duration_minutes).filter(
+        Appointment.veterinarian_id == veterinarian_id,
+        Appointment.appointment_date == day,
+        Appointment.status != 'cancelled'
+    ).all()
+
+    return DayPlan.from_schedule(schedule, appointments)
+
+
+def load_schedules(veterinarian_ids):
+    """Horarios semanales de varios veterinarios: {(veterinarian_id, día de la semana): horario}.
+
+    Aplica la misma precedencia que get_day_schedule y omite los días no laborables.
+    """
+    schedules = {
+        (schedule.staff_id, schedule.day_of_week): schedule
+        for schedule in StaffSchedule.query.filter(StaffSchedule.staff_id.in_(veterinarian_ids))
+    }
+    for availability in VeterinarianAvailability.query.filter(
+            VeterinarianAvailability.veterinarian_id.in_(veterinarian_ids),
+            VeterinarianAvailability.is_available.is_(True)):
+        schedules.setdefault((availability.veterinarian_id, availability.day_of_week), availability)
+
+    return {key: schedule for key, schedule in schedules.items() if schedule.is_available}
+
+
+def build_day_plans(veterinarian_ids, date_from, date_to, schedules, appointments):
+    """DayPlan por (veterinario, fecha) a partir de horarios y de {(veterinario, fecha): [(hora, duración)]}."""
+    plans = {}
+    day = date_from
+    while day <= date_to:
+        for vet_id in veterinarian_ids:
+            schedule = schedules.get((vet_id, day.weekday()))
+            if schedule:
+                plans[(vet_id, day)] = DayPlan.from_schedule(schedule, appointments.get((vet_id, day), ()))
+        day += timedelta(days=1)
+
+    return plans
+
+
+def load_day_plans(veterinarian_ids, date_from, date_to):
+    """DayPlan de varios veterinarios para un rango de fechas con consultas en bloque.
+
+    Devuelve {(veterinarian_id, fecha): DayPlan} solo para los días laborables.
+    El número de consultas no depende de cuántos veterinarios o días haya.
+    """
+    veterinarian_ids = list(veterinarian_ids)
+    if not veterinarian_ids:
+        return {}
+
+    schedules = load_schedules(veterinarian_ids)
+
+    appointments = {}
+    for vet_id, day, start_time, duration in Appointment.query.with_entities(
+            Appointment.veterinarian_id, Appointment.appointment_date,
+            Appointment.appointment_time, Appointment.duration_minutes).filter(
+            Appointment.veterinarian_id.in_(veterinarian_ids),
+            Appointment.appointment_date >= date_from,
+            Appointment.appointment_date <= date_to,
+            Appointment.status != 'cancelled'):
+        appointments.setdefault((vet_id, day), []).append((start_time, duration))
+
+    return build_day_plans(veterinarian_ids, date_from, date_to, schedules, appointments)
+
+
+def load_vet_day_plans(vet_days):
+    """DayPlan solo de los pares (veterinario, fecha) dados, con consultas en bloque.
+
+    Devuelve {(veterinarian_id, fecha): DayPlan} omitiendo los días no laborables.
+    A diferencia de load_day_plans no recorre el rango completo entre la
+    primera y la última fecha.
+    """
+    vet_days = set(vet_days)
+    if not vet_days:
+        return {}
+
+    schedules = load_schedules({vet_id for vet_id, _ in vet_days})
+
+    appointments = {}
+    for vet_id, day, start_time, duration in Appointment.query.with_entities(
+            Appointment.veterinarian_id, Appointment.appointment_date,
+            Appointment.appointment_time, Appointment.duration_minutes).filter(
+            tuple_(Appointment.veterinarian_id, Appointment.appointment_date).in_(list(vet_days)),
+            Appointment.status != 'cancelled'):
+        appointments.setdefault((vet_id, day), []).append((start_time, duration))
+
+    plans = {}
+    for vet_id, day in vet_days:
+        schedule = schedules.get((vet_id, day.weekday()))
+        if schedule:
+            plans[(vet_id, day)] = DayPlan.from_schedule(schedule, appointments.get((vet_id, day), ()))
+
+    return plans
+
+
+def load_calendar(veterinarian_ids, date_from, date_to):
+    """DayPlan y citas activas de varios veterinarios para el calendario.
+
+    Devuelve ({(veterinario, fecha): DayPlan}, {(veterinario, fecha): [cita]}),
+    donde cada cita es una fila con id, hora, duración, mascota, cliente y estado.
+    """
+    veterinarian_ids = list(veterinarian_ids)
+    if not veterinarian_ids:
+        return {}, {}
+
+    schedules = load_schedules(veterinarian_ids)
+
+    rows = {}
+    for row in Appointment.query.with_entities(
+            Appointment.id, Appointment.veterinarian_id, Appointment.appointment_date,
+            Appointment.appointment_time, Appointment.duration_minutes, Appointment.pet_id,
+            Appointment.client_id, Appointment.status).filter(
+            Appointment.veterinarian_id.in_(veterinarian_ids),
+            Appointment.appointment_date >= date_from,
+            Appointment.appointment_date <= date_to,
+            Appointment.status != 'cancelled').order_by(Appointment.appointment_time):
+        rows.setdefault((row.veterinarian_id, row.appointment_date), []).append(row)
+
+    appointments = {
+        key: [(row.appointment_time, row.duration_minutes) for row in day_rows]
+        for key, day_rows in rows.items()
+    }
+    plans = build_day_plans(veterinarian_ids, date_from, date_to, schedules, appointments)
+
+    return plans, rows
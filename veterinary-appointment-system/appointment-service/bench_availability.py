@@ -0,0 +1,48 @@
+# bench_availability.py
+# Microbenchmark del motor de disponibilidad: tiempo por veterinario-día, sin base de datos.
+# Uso: python bench_availability.py [--days 20000] [--appointments 12]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from availability import DayPlan
+
+
+def build_day(rng, appointments):
+    # Jornada de 08:00 a 18:00 con descanso de 13:00 a 14:00 y citas de 15 a 60 minutos
+    plan = DayPlan(8 * 60, 18 * 60, breaks=[(13 * 60, 14 * 60)], slot_step=15)
+    for _ in range(appointments):
+        plan.book(rng.randrange(8 * 60, 17 * 60, 15), rng.choice((15, 30, 45, 60)))
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del cálculo de huecos por día')
+    parser.add_argument('--days', type=int, default=20000)
+    parser.add_argument('--appointments', type=int, default=12)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    plans = [build_day(rng, args.appointments) for _ in range(args.days)]
+
+    start = time.perf_counter()
+    total_slots = sum(len(plan.available_slots(30)) for plan in plans)
+    elapsed = time.perf_counter() - start
+
+    print(f'{args.days} veterinario-días, {args.appointments} citas/día, {total_slots} huecos')
+    print(f'{elapsed / args.days * 1e6:.1f} µs por día')
+
+    start = time.perf_counter()
+    for plan in plans:
+        plan.check(10 * 60, 30)
+    elapsed = time.perf_counter() - start
+    print(f'{elapsed / args.days * 1e6:.1f} µs por comprobación de conflicto')
+
+
+if __name__ == '__main__':
+    main()
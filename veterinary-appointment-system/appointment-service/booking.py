@@ -0,0 +1,95 @@
+# appointment-service/booking.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from appointment_rollup import appointment_rollup
+from db import db
+from models import Appointment
+from slot_cache import slot_cache
+from events import appointment_events, CREATED
+from occupancy import reserve
+
+# Violación de la restricción de exclusión o de unicidad en PostgreSQL
+CONFLICT_PGCODES = ('23P01', '23505')
+
+BOOK_APPOINTMENT_SQL = text("""
+    INSERT INTO appointments (client_id, veterinarian_id, pet_id, appointment_date, appointment_time,
+                              duration_minutes, reason, notes, status, created_at, updated_at)
+    SELECT :client_id, :veterinarian_id, :pet_id, :appointment_date, :appointment_time,
+           :duration_minutes, :reason, :notes, 'scheduled', :now, :now
+    WHERE NOT EXISTS (
+        -- Se compara fecha + hora, como appointments_no_overlap: time + interval da la vuelta a
+        -- medianoche. Las citas duran como mucho un día, así que basta mirar el día anterior
+        SELECT 1 FROM appointments
+        WHERE veterinarian_id = :veterinarian_id
+          AND appointment_date BETWEEN CAST(:appointment_date AS DATE) - 1 AND CAST(:end_date AS DATE)
+          AND status <> 'cancelled'
+          AND appointment_date + appointment_time < :end_at
+          AND appointment_date + appointment_time + COALESCE(duration_minutes, 30) * INTERVAL '1 minute' > :start_at
+    )
+    RETURNING id
+""")
+
+
+class BookingConflict(Exception):
+    """El hueco solicitado ya está ocupado por otra cita."""
+
+
+class CapacityReached(BookingConflict):
+    """El veterinario ya tiene max_appointments citas ese día."""
+
+
+def book_appointment(data, max_appointments=None):
+    """Inserta la cita solo si no se solapa con otra activa del mismo veterinario.
+
+    La comprobación y la inserción son una única sentencia. Si dos reservas
+    concurrentes pasan ambas el NOT EXISTS, la restricción de exclusión
+    appointments_no_overlap rechaza la segunda, así que no hay ventana entre
+    lectura y escritura. Antes ocupa una plaza en vet_day_occupancy con un
+    UPDATE condicional, así que max_appointments se respeta sin contar filas.
+    Devuelve la cita (sin asociar a la sesión) o lanza BookingConflict
+    (CapacityReached si el día está completo). No confirma la transacción.
+    """
+    now = datetime.utcnow()
+    start = datetime.combine(data['appointment_date'], data['appointment_time'])
+    end = start + timedelta(minutes=data['duration_minutes'])
+
+    params = {
+        'client_id': data['client_id'],
+        'veterinarian_id': data['veterinarian_id'],
+        'pet_id': data['pet_id'],
+        'appointment_date': data['appointment_date'],
+        'appointment_time': data['appointment_time'],
+        'start_at': start,
+        'end_at': end,
+        'end_date': end.date(),
+        'duration_minutes': data['duration_minutes'],
+        'reason': data.get('reason'),
+        'notes': data.get('notes'),
+        'now': now
+    }
+
+    # El savepoint limita un conflicto a esta reserva y deja viva la transacción exterior
+    try:
+        with db.session.begin_nested():
+            if not reserve(data['veterinarian_id'], data['appointment_date'], max_appointments):
+                raise CapacityReached()
+            appointment_id = db.session.execute(BOOK_APPOINTMENT_SQL, params).scalar()
+            # Sin fila insertada se deshace también la plaza ocupada
+            if appointment_id is None:
+                raise BookingConflict()
+    except IntegrityError as e:
+        if getattr(e.orig, 'pgcode', None) in CONFLICT_PGCODES:
+            raise BookingConflict() from e
+        raise
+
+    # El INSERT no pasa por el ORM, así que resumen diario, caché de huecos y eventos se actualizan aquí
+    slot_cache.mark_day(db.session, data['veterinarian_id'], data['appointment_date'])
+    appointment_rollup.apply(db.session.connection(),
+                             {(data['appointment_date'], data['veterinarian_id'], 'scheduled'): 1})
+
+    appointment = Appointment(id=appointment_id, status='scheduled', created_at=now, updated_at=now, **data)
+    appointment_events.record(db.session, CREATED, appointment)
+    return appointment
@@ -4,6 +4,9 @@ from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 from db import db  # Importar la instancia singleton
+from token_verifier import token_verifier
+from appointment_rollup import appointment_rollup
+from slot_cache import slot_cache
 
 load_dotenv()
 
@@ -15,9 +18,20 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['AUTH_SERVICE_URL'] = os.getenv('AUTH_SERVICE_URL')
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+    app.config['TOKEN_REVOCATION_REFRESH_SECONDS'] = int(os.getenv('TOKEN_REVOCATION_REFRESH_SECONDS', 30))
+    app.config['TOKEN_CACHE_MAXSIZE'] = int(os.getenv('TOKEN_CACHE_MAXSIZE', 4096))
+    app.config['TOKEN_CACHE_TTL_SECONDS'] = int(os.getenv('TOKEN_CACHE_TTL_SECONDS', 60))
+    app.config['SLOT_CACHE_ENABLED'] = os.getenv('SLOT_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['SLOT_CACHE_MAXSIZE'] = int(os.getenv('SLOT_CACHE_MAXSIZE', 10000))
+    app.config['SLOT_CACHE_TTL_SECONDS'] = int(os.getenv('SLOT_CACHE_TTL_SECONDS', 300))
+    app.config['APPOINTMENT_ROLLUP_ENABLED'] = os.getenv('APPOINTMENT_ROLLUP_ENABLED', 'false').lower() == 'true'
 
     # Inicializar extensiones
     db.init_app(app)
+    token_verifier.init_app(app)
+    appointment_rollup.init_app(app)
+    slot_cache.init_app(app)
     CORS(app)
 
     # Ruta de salud
@@ -0,0 +1,111 @@
+# appointment-service/events.py
+import itertools
+import queue
+import threading
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Appointment
+from session_changes import on_commit
+
+# Tipos de evento publicados
+CREATED = 'created'
+UPDATED = 'updated'
+CANCELLED = 'cancelled'
+
+
+class Subscription:
+    """Cola de eventos de un cliente conectado, con su filtro por veterinario y fecha."""
+
+    def __init__(self, veterinarian_id=None, day=None, maxsize=100):
+        self.veterinarian_id = veterinarian_id
+        self.day = day
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def matches(self, appointment):
+        if self.veterinarian_id is not None and appointment['veterinarian_id'] != self.veterinarian_id:
+            return False
+        if self.day is not None and appointment['appointment_date'] != self.day:
+            return False
+        return True
+
+    def get(self, timeout):
+        """Siguiente evento o None si no llega ninguno en timeout segundos."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """Bus de eventos en memoria que reparte los cambios de citas a los suscriptores.
+
+    Publicar no toca la base de datos y solo recorre los suscriptores
+    conectados, así que mantener abiertos muchos paneles apenas cuesta. Un
+    suscriptor que no consume a tiempo se marca como desbordado y se
+    desconecta; al reconectar puede ponerse al día con /changes. El bus es
+    local al proceso.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, veterinarian_id=None, day=None):
+        subscription = Subscription(veterinarian_id, day)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, appointment):
+        """Envía {'id', 'type', 'appointment'} a los suscriptores cuyo filtro coincide."""
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.matches(appointment)]
+            message = {'id': next(self._ids), 'type': event_type, 'appointment': appointment}
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+    def record(self, session, event_type, appointment):
+        """Publica el evento cuando la sesión confirme; se descarta si hace rollback su savepoint."""
+        _pending_events(session, (event_type, appointment.to_dict()))
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+appointment_events = EventBus()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_appointment_events(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            appointment_events.record(session, CREATED, obj)
+
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and session.is_modified(obj):
+            status = inspect(obj).attrs['status'].history
+            cancelled = status.added and status.added[0] == 'cancelled'
+            appointment_events.record(session, CANCELLED if cancelled else UPDATED, obj)
+
+
+def _publish_appointment_events(pending):
+    for event_type, appointment in pending:
+        appointment_events.publish(event_type, appointment)
+
+
+# Un savepoint fallido de un lote descarta solo sus eventos, no los de las operaciones anteriores
+_pending_events = on_commit('appointment_events', _publish_appointment_events)
@@ -36,6 +36,38 @@ class Appointment(db.Model):
         }
 
 
+class AppointmentDailyRollup(db.Model):
+    __tablename__ = 'appointment_daily_rollup'
+
+    day = db.Column(db.Date, primary_key=True)
+    veterinarian_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    appointment_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'veterinarian_id': self.veterinarian_id,
+            'status': self.status,
+            'appointment_count': self.appointment_count
+        }
+
+
+class VetDayOccupancy(db.Model):
+    __tablename__ = 'vet_day_occupancy'
+
+    veterinarian_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    booked_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'veterinarian_id': self.veterinarian_id,
+            'day': self.day.isoformat() if self.day else None,
+            'booked_count': self.booked_count
+        }
+
+
 class Pet(db.Model):
     __tablename__ = 'pets'
 
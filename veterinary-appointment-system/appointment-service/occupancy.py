@@ -0,0 +1,107 @@
+# appointment-service/occupancy.py
+from collections import Counter
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from db import db
+from models import Appointment, VetDayOccupancy
+from session_changes import old_and_new, track_deltas
+
+ENSURE_ROW_SQL = text("""
+    INSERT INTO vet_day_occupancy (veterinarian_id, day, booked_count)
+    VALUES (:veterinarian_id, :day, 0)
+    ON CONFLICT (veterinarian_id, day) DO NOTHING
+""")
+
+# El UPDATE bloquea la fila del veterinario-día: las reservas concurrentes del mismo día
+# se serializan aquí y ninguna puede superar max_appointments
+RESERVE_SQL = text("""
+    UPDATE vet_day_occupancy
+    SET booked_count = booked_count + 1
+    WHERE veterinarian_id = :veterinarian_id
+      AND day = :day
+      AND (CAST(:max_appointments AS INTEGER) IS NULL OR booked_count < :max_appointments)
+    RETURNING booked_count
+""")
+
+
+def reserve(veterinarian_id, day, max_appointments):
+    """Ocupa una plaza del veterinario-día si queda capacidad; devuelve False si está completo.
+
+    Debe ejecutarse en la misma transacción que inserta la cita.
+    """
+    params = {'veterinarian_id': veterinarian_id, 'day': day, 'max_appointments': max_appointments}
+    db.session.execute(ENSURE_ROW_SQL, params)
+    return db.session.execute(RESERVE_SQL, params).scalar() is not None
+
+
+def reserve_reactivation(appointment, max_appointments):
+    """Ocupa plaza para una cita cancelada que vuelve a activarse; False si el día está completo.
+
+    Llamar antes de cambiar el estado: el +1 que sumará el flush queda compensado aquí.
+    """
+    key = (appointment.veterinarian_id, appointment.appointment_date)
+    if not reserve(*key, max_appointments):
+        return False
+    db.session.info.setdefault('occupancy_deltas', Counter())[key] -= 1
+    return True
+
+
+def apply(connection, deltas):
+    """Suma los incrementos {(veterinario, fecha): n} a la ocupación."""
+    rows = [
+        {'veterinarian_id': vet_id, 'day': day, 'booked_count': delta}
+        for (vet_id, day), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+
+    table = VetDayOccupancy.__table__
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['veterinarian_id', 'day'],
+        set_={'booked_count': table.c.booked_count + stmt.excluded.booked_count}
+    )
+    connection.execute(stmt)
+
+
+def load_occupancy(veterinarian_id, date_from, date_to):
+    """{fecha: citas activas} del veterinario en el rango, leído de los contadores."""
+    rows = VetDayOccupancy.query.filter(
+        VetDayOccupancy.veterinarian_id == veterinarian_id,
+        VetDayOccupancy.day >= date_from,
+        VetDayOccupancy.day <= date_to
+    ).all()
+    return {row.day: row.booked_count for row in rows}
+
+
+def _is_active(status):
+    # La columna tiene 'scheduled' por defecto cuando aún no se ha asignado
+    return status != 'cancelled'
+
+
+# Cambios hechos con el ORM (cancelar, reactivar, borrar). Las reservas pasan por reserve() y
+# las reactivaciones por reserve_reactivation(), que compensa el +1 de aquí.
+def _collect_occupancy_deltas(session, deltas):
+    for obj in session.new:
+        if isinstance(obj, Appointment) and _is_active(obj.status):
+            deltas[(obj.veterinarian_id, obj.appointment_date)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            old = [old_and_new(obj, attr)[0] for attr in ('veterinarian_id', 'appointment_date', 'status')]
+            if _is_active(old[2]):
+                deltas[(old[0], old[1])] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and obj not in session.deleted:
+            changes = [old_and_new(obj, attr) for attr in ('veterinarian_id', 'appointment_date', 'status')]
+            (old_vet, new_vet), (old_day, new_day), (old_status, new_status) = changes
+            if _is_active(old_status):
+                deltas[(old_vet, old_day)] -= 1
+            if _is_active(new_status):
+                deltas[(new_vet, new_day)] += 1
+
+
+track_deltas('occupancy_deltas', _collect_occupancy_deltas, apply)
@@ -1,11 +1,26 @@
 # appointment-service/routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
 from marshmallow import Schema, fields, ValidationError
+from marshmallow.validate import Range
 from datetime import datetime, date, time, timedelta
-import requests
-import os
+import base64
+import csv
+import io
+import json
 from models import Appointment, Pet, VeterinarianAvailability
 from db import db  # Importar desde db.py
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
+from availability import from_minutes, to_minutes, OUTSIDE_HOURS, FULLY_BOOKED
+from availability_store import load_day_plan, load_day_plans, load_vet_day_plans, load_calendar, load_schedules
+from occupancy import load_occupancy, reserve_reactivation
+from booking import book_appointment, BookingConflict, CapacityReached, CONFLICT_PGCODES
+from appointment_rollup import collect_stats, STATUSES
+from vet_directory import get_veterinarians
+from token_verifier import token_verifier
+from slot_cache import slot_cache
+from user_lookup import lookup_users
+from events import appointment_events
 
 
 
@@ -19,7 +34,7 @@ class AppointmentSchema(Schema):
     pet_id = fields.Int(required=True)
     appointment_date = fields.Date(required=True)
     appointment_time = fields.Time(required=True)
-    duration_minutes = fields.Int(load_default=30)
+    duration_minutes = fields.Int(load_default=30, validate=Range(min=1, max=24 * 60))
     reason = fields.Str(required=True)
     notes = fields.Str()
 
@@ -37,20 +52,221 @@ class PetSchema(Schema):
 appointment_schema = AppointmentSchema()
 pet_schema = PetSchema()
 
+# Paginación del listado de citas
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+APPOINTMENT_FIELDS = ('id', 'client_id', 'veterinarian_id', 'pet_id', 'appointment_date', 'appointment_time',
+                      'duration_minutes', 'reason', 'status', 'notes', 'created_at', 'updated_at')
+# Columnas del orden (fecha, hora, id), necesarias siempre para construir el cursor
+CURSOR_FIELDS = ('appointment_date', 'appointment_time', 'id')
 
-# Función para verificar token con el servicio de autenticación
+# Relaciones que ?include= puede expandir y las columnas de la cita que necesita cada una
+INCLUDE_OPTIONS = {'pet': 'pet_id', 'client': 'client_id', 'veterinarian': 'veterinarian_id'}
+PET_INCLUDE_COLUMNS = (Pet.name, Pet.species, Pet.breed)
+CLIENT_INCLUDE_FIELDS = ('id', 'first_name', 'last_name', 'email', 'phone')
+VETERINARIAN_INCLUDE_FIELDS = ('id', 'first_name', 'last_name', 'specialization')
+
+
+def encode_cursor(appointment_date, appointment_time, appointment_id):
+    raw = f'{appointment_date.isoformat()}|{appointment_time.isoformat()}|{appointment_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Devuelve (fecha, hora, id) o lanza ValueError si el cursor no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_part, time_part, id_part = raw.split('|')
+        return date.fromisoformat(date_part), time.fromisoformat(time_part), int(id_part)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def encode_change_cursor(updated_at, appointment_id):
+    raw = f'{updated_at.isoformat()}|{appointment_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_change_cursor(cursor):
+    """Devuelve (updated_at, id) o lanza ValueError si el cursor no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        updated_part, id_part = raw.split('|')
+        return datetime.fromisoformat(updated_part), int(id_part)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def parse_fields(fields_param, allowed, required=()):
+    """Columnas pedidas en ?fields=, más las obligatorias; lanza ValueError si alguna no existe."""
+    if not fields_param:
+        return list(allowed)
+
+    requested = [field.strip() for field in fields_param.split(',') if field.strip()]
+    invalid = [field for field in requested if field not in allowed]
+    if invalid:
+        raise ValueError(f'Invalid fields: {", ".join(invalid)}')
+
+    return list(dict.fromkeys(list(required) + requested))
+
+
+def parse_id_list(param):
+    """Lista de enteros sin duplicados de un parámetro '1,2,3'; lanza ValueError si no es válida."""
+    ids = list(dict.fromkeys(int(value) for value in (request.args.get(param) or '').split(',') if value.strip()))
+    if not ids:
+        raise ValueError(f'{param} is required')
+    if len(ids) > MAX_OWNER_IDS:
+        raise ValueError(f'At most {MAX_OWNER_IDS} ids per request')
+    return ids
+
+
+def parse_include():
+    """Relaciones pedidas en ?include=pet,client,veterinarian; lanza ValueError si alguna no existe."""
+    include = [value.strip() for value in (request.args.get('include') or '').split(',') if value.strip()]
+    invalid = [value for value in include if value not in INCLUDE_OPTIONS]
+    if invalid:
+        raise ValueError(f'Invalid include: {", ".join(invalid)}')
+    return set(include)
+
+
+def appointment_columns(fields, include):
+    """Columnas de la consulta: las de fields y, si se incluye la mascota, las de pets."""
+    columns = [getattr(Appointment, field) for field in fields]
+    if 'pet' in include:
+        columns += PET_INCLUDE_COLUMNS
+    return columns
+
+
+def serialize_appointments(fields, include, rows):
+    """Convierte las filas en diccionarios y añade las relaciones pedidas.
+
+    La mascota viene del JOIN de la propia consulta; clientes y veterinarios
+    se resuelven con una sola llamada por lote a auth-service.
+    """
+    items = []
+    for row in rows:
+        item = serialize_row(fields, row[:len(fields)])
+        if 'pet' in include:
+            name, species, breed = row[len(fields):]
+            item['pet'] = {'id': item['pet_id'], 'name': name, 'species': species, 'breed': breed} \
+                if name is not None else None
+        items.append(item)
+
+    person_includes = [(key, INCLUDE_OPTIONS[key], allowed) for key, allowed in
+                       (('client', CLIENT_INCLUDE_FIELDS), ('veterinarian', VETERINARIAN_INCLUDE_FIELDS))
+                       if key in include]
+    if person_includes:
+        user_ids = {item[column] for item in items for _, column, _ in person_includes}
+        users = lookup_users(user_ids, request.headers.get('Authorization', ''))
+        for item in items:
+            for key, column, allowed in person_includes:
+                user = users.get(item[column])
+                item[key] = {field: user.get(field) for field in allowed} if user else None
+
+    return items
+
+
+def with_included(query, include):
+    if 'pet' in include:
+        query = query.outerjoin(Pet, Pet.id == Appointment.pet_id)
+    return query
+
+
+def filter_appointments(query):
+    """Aplica los filtros opcionales de la petición (cliente, veterinario, estado, fechas)."""
+    client_id = request.args.get('client_id', type=int)
+    veterinarian_id = request.args.get('veterinarian_id', type=int)
+    status = request.args.get('status')
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+
+    if client_id:
+        query = query.filter_by(client_id=client_id)
+    if veterinarian_id:
+        query = query.filter_by(veterinarian_id=veterinarian_id)
+    if status:
+        query = query.filter_by(status=status)
+    if date_from:
+        query = query.filter(Appointment.appointment_date >= date_from)
+    if date_to:
+        query = query.filter(Appointment.appointment_date <= date_to)
+
+    return query
+
+
+def serialize_row(fields, row):
+    item = {}
+    for field, value in zip(fields, row):
+        item[field] = value.isoformat() if isinstance(value, (date, time)) else value
+    return item
+
+
+# Operaciones por lote
+MAX_BATCH_OPERATIONS = 200
+BATCH_OPERATIONS = ('create', 'update', 'cancel')
+UPDATABLE_FIELDS = ('status', 'notes', 'reason')
+
+# Feed de cambios: el trigger fija updated_at al inicio de la transacción (UTC), así que ninguna
+# transacción abierta puede confirmar filas anteriores al inicio de la más antigua de ellas.
+# Sin transacciones visibles (p. ej. sin permiso sobre pg_stat_activity) se toma now()
+CHANGES_SETTLED_BEFORE_SQL = text("""
+    SELECT coalesce(min(xact_start), now()) AT TIME ZONE 'UTC'
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+      AND backend_type = 'client backend'
+      AND xact_start IS NOT NULL
+""")
+
+# Intervalo de los comentarios keep-alive del stream SSE (segundos)
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Máximo de propietarios o clientes por consulta agrupada
+MAX_OWNER_IDS = 500
+
+# Tamaños de celda admitidos por el calendario (minutos)
+CALENDAR_GRANULARITIES = (5, 10, 15, 20, 30, 60)
+
+# Exportación: filas leídas por lote desde un cursor del servidor
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+# Límites de las búsquedas de disponibilidad
+MAX_AVAILABILITY_WINDOW_DAYS = 31
+DEFAULT_SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 100
+
+
+def parse_date_window(default_days=7):
+    """Lee ?from= y ?to= (YYYY-MM-DD); devuelve (desde, hasta, error)."""
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() \
+            if request.args.get('from') else datetime.now().date()
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() \
+            if request.args.get('to') else date_from + timedelta(days=default_days - 1)
+    except ValueError:
+        return None, None, 'Invalid date format'
+
+    if date_to < date_from:
+        return None, None, 'to must not be before from'
+    if (date_to - date_from).days >= MAX_AVAILABILITY_WINDOW_DAYS:
+        return None, None, f'Date range cannot exceed {MAX_AVAILABILITY_WINDOW_DAYS} days'
+
+    return date_from, date_to, None
+
+
+# Función para verificar token (localmente, sin llamar al servicio de autenticación)
 def verify_token(token):
-    headers = {'Authorization': f'Bearer {token}'}
-    response = requests.get(f"{os.getenv('AUTH_SERVICE_URL')}/api/auth/verify-token", headers=headers)
-    return response.status_code == 200
+    return token_verifier.verify(token)
 
 
 # Middleware para verificar autenticación
 def require_auth(f):
     def decorated_function(*args, **kwargs):
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        if not token or not verify_token(token):
+        current_user = verify_token(token)
+        if not current_user:
             return jsonify({'error': 'Unauthorized'}), 401
+        g.current_user = current_user
         return f(*args, **kwargs)
 
     decorated_function.__name__ = f.__name__
@@ -66,47 +282,33 @@ def create_appointment():
     except ValidationError as err:
         return jsonify({'errors': err.messages}), 400
 
-    # Verificar disponibilidad del veterinario
-    appointment_date = data['appointment_date']
-    appointment_time = data['appointment_time']
+    # Verificar disponibilidad del veterinario (horario, descansos, duración y capacidad)
+    plan = load_day_plan(data['veterinarian_id'], data['appointment_date'])
 
-    # Obtener el día de la semana (0 = Lunes, 6 = Domingo)
-    day_of_week = appointment_date.weekday()
-
-    # Verificar si el veterinario trabaja ese día
-    availability = VeterinarianAvailability.query.filter_by(
-        veterinarian_id=data['veterinarian_id'],
-        day_of_week=day_of_week,
-        is_available=True
-    ).first()
-
-    if not availability:
+    if not plan:
         return jsonify({'error': 'Veterinarian not available on this day'}), 400
 
-    # Verificar si el horario está dentro de las horas de trabajo
-    if appointment_time < availability.start_time or appointment_time >= availability.end_time:
-        return jsonify({'error': 'Appointment time outside working hours'}), 400
-
-    # Verificar si no hay conflicto con otra cita
-    existing_appointment = Appointment.query.filter_by(
-        veterinarian_id=data['veterinarian_id'],
-        appointment_date=appointment_date,
-        appointment_time=appointment_time
-    ).first()
+    reason = plan.check(to_minutes(data['appointment_time']), data['duration_minutes'])
 
-    if existing_appointment:
+    if reason == OUTSIDE_HOURS:
+        return jsonify({'error': 'Appointment time outside working hours'}), 400
+    if reason == FULLY_BOOKED:
+        return jsonify({'error': 'Veterinarian is fully booked on this day'}), 409
+    if reason:
         return jsonify({'error': 'Time slot already booked'}), 409
 
-    # Crear la cita
-    appointment = Appointment(**data)
-
+    # Crear la cita: la inserción condicional y la restricción de exclusión evitan dobles reservas
     try:
-        db.session.add(appointment)
+        appointment = book_appointment(data, plan.max_appointments)
         db.session.commit()
         return jsonify({
             'message': 'Appointment created successfully',
             'appointment': appointment.to_dict()
         }), 201
+    except CapacityReached:
+        return jsonify({'error': 'Veterinarian is fully booked on this day'}), 409
+    except BookingConflict:
+        return jsonify({'error': 'Time slot already booked'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error creating appointment', 'message': str(e)}), 500
@@ -115,42 +317,195 @@ def create_appointment():
 @appointment_bp.route('/appointments', methods=['GET'])
 @require_auth
 def get_appointments():
-    # Filtros opcionales
-    client_id = request.args.get('client_id', type=int)
-    veterinarian_id = request.args.get('veterinarian_id', type=int)
-    status = request.args.get('status')
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
+    query = filter_appointments(Appointment.query)
 
-    query = Appointment.query
+    # Paginación por cursor sobre (fecha, hora, id) y proyección de columnas en SQL
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    try:
+        include = parse_include()
+        required = CURSOR_FIELDS + tuple(INCLUDE_OPTIONS[key] for key in include)
+        fields = parse_fields(request.args.get('fields'), APPOINTMENT_FIELDS, required=required)
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if cursor:
+        query = query.filter(db.tuple_(Appointment.appointment_date, Appointment.appointment_time,
+                                       Appointment.id) > cursor)
+
+    rows = with_included(query, include).with_entities(*appointment_columns(fields, include)) \
+        .order_by(Appointment.appointment_date, Appointment.appointment_time, Appointment.id) \
+        .limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.appointment_date, last.appointment_time, last.id)
+
+    return jsonify({
+        'appointments': serialize_appointments(fields, include, rows),
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }), 200
 
-    if client_id:
-        query = query.filter_by(client_id=client_id)
-    if veterinarian_id:
-        query = query.filter_by(veterinarian_id=veterinarian_id)
-    if status:
-        query = query.filter_by(status=status)
-    if date_from:
-        query = query.filter(Appointment.appointment_date >= date_from)
-    if date_to:
-        query = query.filter(Appointment.appointment_date <= date_to)
 
-    appointments = query.order_by(Appointment.appointment_date, Appointment.appointment_time).all()
+@appointment_bp.route('/appointments/export', methods=['GET'])
+@require_auth
+def export_appointments():
+    """Exporta las citas filtradas como NDJSON o CSV sin cargarlas todas en memoria."""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Invalid format, use one of: {", ".join(EXPORT_FORMATS)}'}), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'), APPOINTMENT_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # yield_per usa un cursor del servidor: solo hay un lote de filas en memoria
+    query = filter_appointments(Appointment.query) \
+        .with_entities(*[getattr(Appointment, field) for field in fields]) \
+        .order_by(Appointment.appointment_date, Appointment.appointment_time, Appointment.id) \
+        .yield_per(EXPORT_BATCH_SIZE)
+
+    def generate_ndjson():
+        for row in query:
+            yield json.dumps(serialize_row(fields, row)) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for row in query:
+            writer.writerow(serialize_row(fields, row).values())
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    if export_format == 'csv':
+        generator, mimetype = generate_csv(), 'text/csv'
+    else:
+        generator, mimetype = generate_ndjson(), 'application/x-ndjson'
+
+    response = Response(stream_with_context(generator), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=appointments.{export_format}'
+    return response
+
+
+@appointment_bp.route('/changes', methods=['GET'])
+@require_auth
+def get_changes():
+    """Citas creadas, modificadas o canceladas después del cursor, en orden (updated_at, id).
+
+    Sin ?since= no devuelve cambios, solo el cursor desde el que empezar a
+    consultar. Acepta los mismos filtros e include= que el listado de citas.
+    """
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    # Incluye la transacción de esta petición, así que nunca es posterior a su propio now()
+    settled_before = db.session.execute(CHANGES_SETTLED_BEFORE_SQL).scalar()
+
+    try:
+        include = parse_include()
+        since = decode_change_cursor(request.args['since']) if request.args.get('since') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if since is None:
+        return jsonify({'changes': [], 'next_cursor': encode_change_cursor(settled_before, 0), 'has_more': False}), 200
+
+    fields = list(APPOINTMENT_FIELDS)
+    query = filter_appointments(Appointment.query).filter(
+        db.tuple_(Appointment.updated_at, Appointment.id) > since,
+        Appointment.updated_at < settled_before
+    )
+    rows = with_included(query, include).with_entities(*appointment_columns(fields, include)) \
+        .order_by(Appointment.updated_at, Appointment.id) \
+        .limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Sin cambios, el cursor no avanza: la siguiente consulta vuelve a mirar desde el mismo punto
+    next_cursor = request.args['since']
+    if rows:
+        last = rows[-1]
+        next_cursor = encode_change_cursor(last.updated_at, last.id)
 
     return jsonify({
-        'appointments': [appointment.to_dict() for appointment in appointments]
+        'changes': serialize_appointments(fields, include, rows),
+        'next_cursor': next_cursor,
+        'has_more': has_more
     }), 200
 
 
+@appointment_bp.route('/appointments/stream', methods=['GET'])
+@require_auth
+def stream_appointments():
+    """Server-Sent Events con las citas creadas, modificadas y canceladas.
+
+    Filtros opcionales ?veterinarian_id= y ?date=YYYY-MM-DD. Los eventos salen
+    del bus en memoria, así que un panel abierto no consulta la base de datos.
+    """
+    veterinarian_id = request.args.get('veterinarian_id', type=int)
+    day = request.args.get('date')
+    if day:
+        try:
+            day = datetime.strptime(day, '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format'}), 400
+
+    subscription = appointment_events.subscribe(veterinarian_id, day)
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            while not subscription.overflowed:
+                message = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ': keepalive\n\n'
+                    continue
+                data = json.dumps({'type': message['type'], 'appointment': message['appointment']})
+                yield f"id: {message['id']}\nevent: {message['type']}\ndata: {data}\n\n"
+        finally:
+            appointment_events.unsubscribe(subscription)
+
+    # Sin stream_with_context: el generador no necesita la petición ni retiene conexiones a la base de datos
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @appointment_bp.route('/appointments/<int:appointment_id>', methods=['GET'])
 @require_auth
 def get_appointment(appointment_id):
-    appointment = Appointment.query.get(appointment_id)
+    try:
+        include = parse_include()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    if not appointment:
+    if not include:
+        appointment = Appointment.query.get(appointment_id)
+
+        if not appointment:
+            return jsonify({'error': 'Appointment not found'}), 404
+
+        return jsonify({'appointment': appointment.to_dict()}), 200
+
+    fields = list(APPOINTMENT_FIELDS)
+    row = with_included(Appointment.query, include).with_entities(*appointment_columns(fields, include)) \
+        .filter(Appointment.id == appointment_id).first()
+
+    if not row:
         return jsonify({'error': 'Appointment not found'}), 404
 
-    return jsonify({'appointment': appointment.to_dict()}), 200
+    return jsonify({'appointment': serialize_appointments(fields, include, [row])[0]}), 200
 
 
 @appointment_bp.route('/appointments/<int:appointment_id>', methods=['PUT'])
@@ -163,6 +518,19 @@ def update_appointment(appointment_id):
 
     data = request.json
 
+    if 'status' in data and data['status'] not in STATUSES:
+        return jsonify({'error': f'status must be one of: {", ".join(STATUSES)}'}), 400
+
+    # Volver a activar una cita cancelada ocupa plaza: se comprueba y reserva como una cita nueva
+    if 'status' in data and data['status'] != 'cancelled' and appointment.status == 'cancelled':
+        plan = load_day_plan(appointment.veterinarian_id, appointment.appointment_date)
+        error = reactivation_error(appointment, plan)
+        if error:
+            return jsonify({'error': error[1]}), error[0]
+        if not reserve_reactivation(appointment, plan.max_appointments):
+            db.session.rollback()
+            return jsonify({'error': 'Veterinarian is fully booked on this day'}), 409
+
     # Actualizar los campos permitidos
     if 'status' in data:
         appointment.status = data['status']
@@ -177,6 +545,11 @@ def update_appointment(appointment_id):
             'message': 'Appointment updated successfully',
             'appointment': appointment.to_dict()
         }), 200
+    except IntegrityError as e:
+        db.session.rollback()
+        if getattr(e.orig, 'pgcode', None) in CONFLICT_PGCODES:
+            return jsonify({'error': 'Time slot already booked'}), 409
+        return jsonify({'error': 'Error updating appointment', 'message': str(e)}), 500
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error updating appointment', 'message': str(e)}), 500
@@ -200,6 +573,175 @@ def cancel_appointment(appointment_id):
         return jsonify({'error': 'Error cancelling appointment', 'message': str(e)}), 500
 
 
+@appointment_bp.route('/appointments/batch', methods=['POST'])
+@require_auth
+def batch_appointments():
+    """Crea, actualiza o cancela varias citas en una sola petición.
+
+    Los conflictos se comprueban contra un único DayPlan precargado por
+    veterinario y día, que se actualiza a medida que avanza el lote. Cada
+    operación va en su propio savepoint y todo se confirma al final; con
+    atomic=true cualquier fallo deshace el lote entero.
+    """
+    body = request.json
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    operations = body.get('operations')
+
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+
+    results = [None] * len(operations)
+    creates = {}
+    existing_ids = set()
+
+    # Validar todo antes de tocar la base de datos
+    for index, operation in enumerate(operations):
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op not in BATCH_OPERATIONS:
+            results[index] = {'index': index, 'status': 400, 'error': f'op must be one of: {", ".join(BATCH_OPERATIONS)}'}
+        elif op == 'create':
+            try:
+                creates[index] = appointment_schema.load(operation.get('data') or {})
+            except ValidationError as err:
+                results[index] = {'index': index, 'status': 400, 'errors': err.messages}
+        elif not isinstance(operation.get('id'), int):
+            results[index] = {'index': index, 'status': 400, 'error': 'id is required'}
+        else:
+            existing_ids.add(operation['id'])
+
+    existing = {a.id: a for a in Appointment.query.filter(Appointment.id.in_(existing_ids))} if existing_ids else {}
+
+    # Instantánea de los veterinario-días afectados, con tres consultas en total
+    vet_days = {(data['veterinarian_id'], data['appointment_date']) for data in creates.values()}
+    vet_days |= {(a.veterinarian_id, a.appointment_date) for a in existing.values()}
+    plans = load_vet_day_plans(vet_days)
+
+    for index, operation in enumerate(operations):
+        if results[index] is not None:
+            continue
+
+        if operation['op'] == 'create':
+            results[index] = batch_create(index, creates[index], plans)
+        else:
+            results[index] = batch_modify(index, operation, existing.get(operation['id']), plans)
+
+    failed = sum(1 for result in results if result['status'] >= 400)
+
+    if failed and body.get('atomic'):
+        db.session.rollback()
+        return jsonify({'error': 'Batch rolled back', 'results': results, 'succeeded': 0, 'failed': failed}), 409
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error applying batch', 'message': str(e)}), 500
+
+    return jsonify({'results': results, 'succeeded': len(results) - failed, 'failed': failed}), 200
+
+
+def batch_create(index, data, plans):
+    plan = plans.get((data['veterinarian_id'], data['appointment_date']))
+    if not plan:
+        return {'index': index, 'status': 400, 'error': 'Veterinarian not available on this day'}
+
+    start = to_minutes(data['appointment_time'])
+    reason = plan.check(start, data['duration_minutes'])
+
+    if reason == OUTSIDE_HOURS:
+        return {'index': index, 'status': 400, 'error': 'Appointment time outside working hours'}
+    if reason == FULLY_BOOKED:
+        return {'index': index, 'status': 409, 'error': 'Veterinarian is fully booked on this day'}
+    if reason:
+        return {'index': index, 'status': 409, 'error': 'Time slot already booked'}
+
+    try:
+        appointment = book_appointment(data, plan.max_appointments)
+    except CapacityReached:
+        return {'index': index, 'status': 409, 'error': 'Veterinarian is fully booked on this day'}
+    except BookingConflict:
+        return {'index': index, 'status': 409, 'error': 'Time slot already booked'}
+    except (IntegrityError, DataError) as e:
+        return batch_database_error(index, e)
+
+    plan.book(start, data['duration_minutes'])
+    return {'index': index, 'status': 201, 'appointment': appointment.to_dict()}
+
+
+def batch_modify(index, operation, appointment, plans):
+    if not appointment:
+        return {'index': index, 'status': 404, 'error': 'Appointment not found'}
+
+    if operation['op'] == 'cancel':
+        changes = {'status': 'cancelled'}
+    else:
+        data = operation.get('data') or {}
+        if not isinstance(data, dict):
+            return {'index': index, 'status': 400, 'error': 'data must be an object'}
+        changes = {field: value for field, value in data.items() if field in UPDATABLE_FIELDS}
+        if 'status' in changes and changes['status'] not in STATUSES:
+            return {'index': index, 'status': 400, 'error': f'status must be one of: {", ".join(STATUSES)}'}
+        if any(value is not None and not isinstance(value, str) for value in changes.values()):
+            return {'index': index, 'status': 400, 'error': 'notes and reason must be strings'}
+
+    was_active = appointment.status != 'cancelled'
+    plan = plans.get((appointment.veterinarian_id, appointment.appointment_date))
+
+    reactivating = not was_active and changes.get('status', 'cancelled') != 'cancelled'
+    if reactivating:
+        error = reactivation_error(appointment, plan)
+        if error:
+            return {'index': index, 'status': error[0], 'error': error[1]}
+
+    try:
+        with db.session.begin_nested():
+            if reactivating and not reserve_reactivation(appointment, plan.max_appointments):
+                raise CapacityReached()
+            for field, value in changes.items():
+                setattr(appointment, field, value)
+    except CapacityReached:
+        return {'index': index, 'status': 409, 'error': 'Veterinarian is fully booked on this day'}
+    except (IntegrityError, DataError) as e:
+        return batch_database_error(index, e)
+
+    # Mantener la instantánea al día para las operaciones siguientes del lote
+    is_active = appointment.status != 'cancelled'
+    if plan and was_active != is_active:
+        start, duration = to_minutes(appointment.appointment_time), appointment.duration_minutes or plan.default_duration
+        if is_active:
+            plan.book(start, duration)
+        else:
+            plan.release(start, duration)
+
+    return {'index': index, 'status': 200, 'appointment': appointment.to_dict()}
+
+
+def reactivation_error(appointment, plan):
+    """(código, mensaje) si la cita cancelada no cabe en el DayPlan del día, o None si puede reactivarse."""
+    if not plan:
+        return 400, 'Veterinarian not available on this day'
+
+    reason = plan.check(to_minutes(appointment.appointment_time), appointment.duration_minutes)
+
+    if reason == OUTSIDE_HOURS:
+        return 400, 'Appointment time outside working hours'
+    if reason == FULLY_BOOKED:
+        return 409, 'Veterinarian is fully booked on this day'
+    if reason:
+        return 409, 'Time slot already booked'
+    return None
+
+
+def batch_database_error(index, error):
+    """Resultado de una operación rechazada por la base de datos: 409 si choca con otra cita, 400 si no."""
+    if isinstance(error, IntegrityError) and getattr(error.orig, 'pgcode', None) in CONFLICT_PGCODES:
+        return {'index': index, 'status': 409, 'error': 'Time slot already booked'}
+    return {'index': index, 'status': 400, 'error': 'Invalid appointment data', 'message': str(error.orig)}
+
+
 # Rutas para mascotas
 @appointment_bp.route('/pets', methods=['POST'])
 @require_auth
@@ -232,6 +774,52 @@ def get_owner_pets(owner_id):
     }), 200
 
 
+@appointment_bp.route('/pets', methods=['GET'])
+@require_auth
+def get_pets_by_owners():
+    """Mascotas de varios propietarios en una sola consulta: /pets?owner_ids=1,2,3"""
+    try:
+        owner_ids = parse_id_list('owner_ids')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    pets = Pet.query.filter(Pet.owner_id.in_(owner_ids)).order_by(Pet.owner_id, Pet.id).all()
+    return jsonify({
+        'pets': [pet.to_dict() for pet in pets]
+    }), 200
+
+
+@appointment_bp.route('/clients/summary', methods=['GET'])
+@require_auth
+def get_clients_summary():
+    """Número de mascotas, de citas y última visita por cliente: /clients/summary?ids=1,2,3"""
+    try:
+        client_ids = parse_id_list('ids')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    today = datetime.now().date()
+    summaries = {client_id: {'pet_count': 0, 'appointment_count': 0, 'last_visit': None} for client_id in client_ids}
+
+    pet_counts = db.session.query(Pet.owner_id, db.func.count(Pet.id)) \
+        .filter(Pet.owner_id.in_(client_ids)).group_by(Pet.owner_id)
+    for owner_id, count in pet_counts:
+        summaries[owner_id]['pet_count'] = count
+
+    # Última visita: la cita pasada más reciente que no se canceló ni quedó sin presentarse
+    last_visit = db.func.max(Appointment.appointment_date).filter(
+        Appointment.appointment_date <= today,
+        Appointment.status.notin_(('cancelled', 'no-show'))
+    )
+    appointment_counts = db.session.query(Appointment.client_id, db.func.count(Appointment.id), last_visit) \
+        .filter(Appointment.client_id.in_(client_ids)).group_by(Appointment.client_id)
+    for client_id, count, visit in appointment_counts:
+        summaries[client_id]['appointment_count'] = count
+        summaries[client_id]['last_visit'] = visit.isoformat() if visit else None
+
+    return jsonify({'summaries': summaries}), 200
+
+
 # Rutas para disponibilidad
 @appointment_bp.route('/availability/<int:veterinarian_id>', methods=['GET'])
 def get_veterinarian_availability(veterinarian_id):
@@ -253,39 +841,192 @@ def get_available_slots(veterinarian_id):
 
     try:
         appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        day_of_week = appointment_date.weekday()
     except ValueError:
         return jsonify({'error': 'Invalid date format'}), 400
 
-    # Obtener disponibilidad del veterinario para ese día
-    availability = VeterinarianAvailability.query.filter_by(
-        veterinarian_id=veterinarian_id,
-        day_of_week=day_of_week,
-        is_available=True
-    ).first()
+    duration = request.args.get('duration', type=int)
+    if duration is not None and not 0 < duration <= 24 * 60:
+        return jsonify({'error': 'Invalid duration'}), 400
 
-    if not availability:
-        return jsonify({'available_slots': []}), 200
+    def compute_slots():
+        plan = load_day_plan(veterinarian_id, appointment_date)
+        return plan.available_slots(duration) if plan else []
 
-    # Obtener citas existentes para ese día
-    existing_appointments = Appointment.query.filter_by(
-        veterinarian_id=veterinarian_id,
-        appointment_date=appointment_date
-    ).filter(Appointment.status != 'cancelled').all()
+    slots = slot_cache.get_slots(veterinarian_id, appointment_date, duration, compute_slots)
+    available_slots = [from_minutes(slot).strftime('%H:%M') for slot in slots]
+
+    return jsonify({'available_slots': available_slots}), 200
 
-    booked_times = [appt.appointment_time for appt in existing_appointments]
 
-    # Generar slots disponibles
-    available_slots = []
-    current_time = availability.start_time
-    slot_duration = timedelta(minutes=30)
+@appointment_bp.route('/token-cache/invalidate', methods=['POST'])
+@require_auth
+def invalidate_token_cache():
+    """Invalidación enviada por auth-service al desactivar o modificar a un usuario"""
+    if g.current_user['role'] != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
 
-    while current_time < availability.end_time:
-        if current_time not in booked_times:
-            available_slots.append(current_time.strftime('%H:%M'))
-        current_time = (datetime.combine(date.today(), current_time) + slot_duration).time()
+    user_id = (request.json or {}).get('user_id')
+    if not isinstance(user_id, int):
+        return jsonify({'error': 'user_id is required'}), 400
 
-    return jsonify({'available_slots': available_slots}), 200
+    evicted = token_verifier.invalidate_user(user_id)
+    return jsonify({'message': 'Token cache invalidated', 'evicted': evicted}), 200
+
+
+@appointment_bp.route('/token-cache/stats', methods=['GET'])
+@require_auth
+def get_token_cache_stats():
+    if g.current_user['role'] != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    return jsonify({'token_cache': token_verifier.cache_stats()}), 200
+
+
+@appointment_bp.route('/availability/<int:veterinarian_id>/fully-booked', methods=['GET'])
+def get_fully_booked_days(veterinarian_id):
+    """Días del rango en que el veterinario ya alcanzó max_appointments, para marcar el calendario.
+
+    Lee los contadores de ocupación, sin contar citas.
+    """
+    date_from, date_to, error = parse_date_window(default_days=MAX_AVAILABILITY_WINDOW_DAYS)
+    if error:
+        return jsonify({'error': error}), 400
+
+    schedules = load_schedules([veterinarian_id])
+    occupancy = load_occupancy(veterinarian_id, date_from, date_to)
+
+    fully_booked = []
+    for day, booked in sorted(occupancy.items()):
+        schedule = schedules.get((veterinarian_id, day.weekday()))
+        max_appointments = getattr(schedule, 'max_appointments', None)
+        if max_appointments is not None and booked >= max_appointments:
+            fully_booked.append(day.isoformat())
+
+    return jsonify({'fully_booked': fully_booked}), 200
+
+
+@appointment_bp.route('/availability/cache-stats', methods=['GET'])
+@require_auth
+def get_slot_cache_stats():
+    if g.current_user['role'] != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    return jsonify({'slot_cache': slot_cache.stats()}), 200
+
+
+@appointment_bp.route('/availability/search', methods=['GET'])
+def search_availability():
+    """Primeros huecos libres de cualquier veterinario dentro de un rango de fechas, en orden temporal"""
+    date_from, date_to, error = parse_date_window()
+    if error:
+        return jsonify({'error': error}), 400
+
+    duration = request.args.get('duration', type=int)
+    if duration is not None and not 0 < duration <= 24 * 60:
+        return jsonify({'error': 'Invalid duration'}), 400
+
+    limit = min(max(request.args.get('limit', DEFAULT_SEARCH_RESULTS, type=int), 1), MAX_SEARCH_RESULTS)
+    species = (request.args.get('species') or '').strip().lower()
+
+    # Los veterinarios no tienen especies asignadas: se filtra por su especialización,
+    # y quienes no declaran ninguna atienden a cualquier especie
+    veterinarians = {
+        vet['id']: vet for vet in get_veterinarians()
+        if not species or not vet.get('specialization') or species in vet['specialization'].lower()
+    }
+
+    plans = load_day_plans(veterinarians.keys(), date_from, date_to)
+
+    # Los huecos ya pasados (días anteriores u horas anteriores de hoy) no se ofrecen
+    now = datetime.now()
+    current_minute = to_minutes(now.time())
+
+    slots = []
+    day = max(date_from, now.date())
+    while day <= date_to and len(slots) < limit:
+        earliest = current_minute if day == now.date() else 0
+        day_slots = sorted(
+            (slot, vet_id)
+            for vet_id in veterinarians
+            if (vet_id, day) in plans
+            for slot in plans[(vet_id, day)].available_slots(duration)
+            if slot >= earliest
+        )
+        for slot, vet_id in day_slots[:limit - len(slots)]:
+            vet = veterinarians[vet_id]
+            slots.append({
+                'veterinarian_id': vet_id,
+                'veterinarian_name': f"{vet['first_name']} {vet['last_name']}",
+                'date': day.isoformat(),
+                'time': from_minutes(slot).strftime('%H:%M')
+            })
+        day += timedelta(days=1)
+
+    return jsonify({'slots': slots}), 200
+
+
+@appointment_bp.route('/calendar', methods=['GET'])
+@require_auth
+def get_calendar():
+    """Rejilla de toda la clínica: por veterinario y día, tramos libres/ocupados/descanso y citas.
+
+    /calendar?from=2024-01-01&to=2024-01-07&granularity=15. Los días en que
+    un veterinario no trabaja aparecen como null.
+    """
+    date_from, date_to, error = parse_date_window()
+    if error:
+        return jsonify({'error': error}), 400
+
+    granularity = request.args.get('granularity', 15, type=int)
+    if granularity not in CALENDAR_GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of: {", ".join(map(str, CALENDAR_GRANULARITIES))}'}), 400
+
+    veterinarians = get_veterinarians()
+    plans, appointments = load_calendar((vet['id'] for vet in veterinarians), date_from, date_to)
+
+    days = []
+    day = date_from
+    while day <= date_to:
+        days.append(day)
+        day += timedelta(days=1)
+
+    grid = {}
+    for vet in veterinarians:
+        vet_days = {}
+        for day in days:
+            plan = plans.get((vet['id'], day))
+            if not plan:
+                vet_days[day.isoformat()] = None
+                continue
+
+            vet_days[day.isoformat()] = {
+                'start': from_minutes(plan.start).strftime('%H:%M'),
+                'end': from_minutes(plan.end).strftime('%H:%M'),
+                'spans': plan.spans(granularity),
+                'appointments': [
+                    {
+                        'id': row.id,
+                        'time': row.appointment_time.strftime('%H:%M'),
+                        'duration_minutes': row.duration_minutes or plan.default_duration,
+                        'pet_id': row.pet_id,
+                        'client_id': row.client_id,
+                        'status': row.status
+                    }
+                    for row in appointments.get((vet['id'], day), ())
+                ]
+            }
+        grid[vet['id']] = vet_days
+
+    return jsonify({
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'granularity': granularity,
+        'veterinarians': [
+            {'id': vet['id'], 'name': f"{vet['first_name']} {vet['last_name']}"} for vet in veterinarians
+        ],
+        'days': [day.isoformat() for day in days],
+        'grid': grid
+    }), 200
 
 
 @appointment_bp.route('/appointments/stats', methods=['GET'])
@@ -303,44 +1044,17 @@ def get_appointment_stats():
     else:
         target_date = datetime.now().date()
 
-    # Estadísticas para el día actual
-    today_appointments = Appointment.query.filter_by(appointment_date=target_date).count()
-
-    # Estadísticas por estado
-    scheduled_count = Appointment.query.filter_by(status='scheduled').count()
-    completed_count = Appointment.query.filter_by(status='completed').count()
-    cancelled_count = Appointment.query.filter_by(status='cancelled').count()
-    no_show_count = Appointment.query.filter_by(status='no-show').count()
-
-    # Estadísticas por veterinario
-    vet_stats_query = db.session.query(
-        Appointment.veterinarian_id,
-        db.func.count(Appointment.id)
-    ).group_by(Appointment.veterinarian_id).all()
-
-    vet_stats = {vet_id: count for vet_id, count in vet_stats_query}
-
-    # Estadísticas por mes (para el año actual)
-    current_year = datetime.now().year
-    monthly_stats_query = db.session.query(
-        db.extract('month', Appointment.appointment_date),
-        db.func.count(Appointment.id)
-    ).filter(
-        db.extract('year', Appointment.appointment_date) == current_year
-    ).group_by(
-        db.extract('month', Appointment.appointment_date)
-    ).all()
-
-    monthly_stats = {int(month): count for month, count in monthly_stats_query}
+    # Conteos por estado, del día, por veterinario y por mes en una sola consulta
+    stats = collect_stats(target_date, datetime.now().year)
 
     return jsonify({
         'appointment_stats': {
-            'today': today_appointments,
-            'scheduled': scheduled_count,
-            'completed': completed_count,
-            'cancelled': cancelled_count,
-            'no_show': no_show_count,
-            'by_veterinarian': vet_stats,
-            'monthly': monthly_stats
+            'today': stats['today'],
+            'scheduled': stats['scheduled'],
+            'completed': stats['completed'],
+            'cancelled': stats['cancelled'],
+            'no_show': stats['no-show'],
+            'by_veterinarian': stats['by_veterinarian'],
+            'monthly': stats['monthly']
         }
     }), 200
\ No newline at end of file
@@ -3,8 +3,12 @@ from marshmallow import Schema, fields, ValidationError, post_load
 from datetime import datetime, time, timedelta
 import requests
 import os
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
 from models import VeterinarianAvailability, Appointment, StaffSchedule
 from db import db
+from token_verifier import token_verifier
+from slot_cache import slot_cache
 
 schedule_bp = Blueprint('schedules', __name__)
 
@@ -35,30 +39,22 @@ class ScheduleSchema(Schema):
 # Instancias de schemas
 schedule_schema = ScheduleSchema()
 
+# Columnas que copy_staff_schedule sobrescribe en los horarios existentes
+SCHEDULE_COPY_COLUMNS = ('start_time', 'end_time', 'break_start', 'break_end', 'max_appointments',
+                         'appointment_duration', 'is_available', 'updated_at')
 
-# Función para verificar token con el servicio de autenticación
-def verify_token(token):
-    headers = {'Authorization': f'Bearer {token}'}
-    response = requests.get(f"{os.getenv('AUTH_SERVICE_URL')}/api/auth/verify-token", headers=headers)
-    return response.status_code == 200
 
-
-# Función para verificar si el usuario es un administrador
+# Función para verificar token y rol de administrador en un solo paso
 def verify_admin(token):
-    headers = {'Authorization': f'Bearer {token}'}
-    response = requests.get(f"{os.getenv('AUTH_SERVICE_URL')}/api/auth/me", headers=headers)
-    if response.status_code != 200:
-        return False
-
-    user_data = response.json().get('user', {})
-    return user_data.get('role') == 'admin'
+    current_user = token_verifier.verify(token)
+    return current_user is not None and current_user['role'] == 'admin'
 
 
 # Middleware para verificar autenticación y permisos de administrador
 def admin_required(f):
     def decorated_function(*args, **kwargs):
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        if not token or not verify_token(token) or not verify_admin(token):
+        if not token or not verify_admin(token):
             return jsonify({'error': 'Admin privileges required'}), 403
         return f(*args, **kwargs)
 
@@ -186,80 +182,110 @@ def delete_staff_schedule(schedule_id):
         return jsonify({'error': 'Error deleting schedule', 'message': str(e)}), 500
 
 
+def parse_staff_id(value):
+    """Id de empleado como entero positivo (acepta también "5"), o None si no es válido."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    return value if isinstance(value, int) and value > 0 else None
+
+
 @schedule_bp.route('/staff-schedules/copy', methods=['POST'])
 @admin_required
 def copy_staff_schedule():
     # Copiar un horario de un empleado a otro o a todos los de un rol
-    source_id = request.json.get('source_staff_id')
-    target_ids = request.json.get('target_staff_ids', [])
+    source_id = parse_staff_id(request.json.get('source_staff_id'))
+    target_ids = request.json.get('target_staff_ids') or []
     target_role = request.json.get('target_role')
 
     if not source_id:
-        return jsonify({'error': 'Source staff ID is required'}), 400
+        return jsonify({'error': 'Source staff ID must be a positive integer'}), 400
 
     if not target_ids and not target_role:
         return jsonify({'error': 'Either target staff IDs or target role is required'}), 400
 
+    # Normalizar antes de deduplicar: [5, "5"] debe ser un único empleado, o el upsert tocaría dos veces la misma fila
+    if not isinstance(target_ids, list):
+        return jsonify({'error': 'target_staff_ids must be a list of positive integers'}), 400
+    target_ids = [parse_staff_id(target_id) for target_id in target_ids]
+    if None in target_ids:
+        return jsonify({'error': 'target_staff_ids must be a list of positive integers'}), 400
+
     # Obtener los horarios de origen
     source_schedules = StaffSchedule.query.filter_by(staff_id=source_id).all()
 
     if not source_schedules:
         return jsonify({'error': 'No schedules found for source staff member'}), 404
 
-    # Si se especifica un rol objetivo, obtener IDs de los empleados con ese rol
+    # Si se especifica un rol objetivo, obtener IDs de los empleados con ese rol en una sola llamada
     if target_role:
-        response = requests.get(f"{os.getenv('AUTH_SERVICE_URL')}/api/admin/staff?role={target_role}")
+        try:
+            response = requests.get(
+                f"{os.getenv('AUTH_SERVICE_URL')}/api/auth/staff-ids",
+                params={'role': target_role},
+                headers={'Authorization': request.headers.get('Authorization', '')},
+                timeout=5
+            )
+        except requests.RequestException:
+            return jsonify({'error': 'Error fetching staff by role'}), 502
         if response.status_code != 200:
             return jsonify({'error': 'Error fetching staff by role'}), 500
 
-        staff_data = response.json().get('staff', [])
-        target_ids = [staff['id'] for staff in staff_data if staff['id'] != source_id]
-
-    success_count = 0
-    error_count = 0
-
-    # Copiar horarios a cada empleado objetivo
-    for target_id in target_ids:
-        for source_schedule in source_schedules:
-            # Verificar si ya existe un horario para ese día
-            existing_schedule = StaffSchedule.query.filter_by(
-                staff_id=target_id,
-                day_of_week=source_schedule.day_of_week
-            ).first()
-
-            if existing_schedule:
-                # Actualizar el horario existente
-                existing_schedule.start_time = source_schedule.start_time
-                existing_schedule.end_time = source_schedule.end_time
-                existing_schedule.break_start = source_schedule.break_start
-                existing_schedule.break_end = source_schedule.break_end
-                existing_schedule.max_appointments = source_schedule.max_appointments
-                existing_schedule.appointment_duration = source_schedule.appointment_duration
-                existing_schedule.is_available = source_schedule.is_available
-            else:
-                # Crear nuevo horario
-                new_schedule = StaffSchedule(
-                    staff_id=target_id,
-                    day_of_week=source_schedule.day_of_week,
-                    start_time=source_schedule.start_time,
-                    end_time=source_schedule.end_time,
-                    break_start=source_schedule.break_start,
-                    break_end=source_schedule.break_end,
-                    max_appointments=source_schedule.max_appointments,
-                    appointment_duration=source_schedule.appointment_duration,
-                    is_available=source_schedule.is_available
-                )
-                db.session.add(new_schedule)
-
-            try:
-                db.session.commit()
-                success_count += 1
-            except Exception as e:
-                db.session.rollback()
-                error_count += 1
+        target_ids = [parse_staff_id(staff_id) for staff_id in response.json().get('ids', [])]
+        target_ids = [staff_id for staff_id in target_ids if staff_id]
+
+    target_ids = [target_id for target_id in dict.fromkeys(target_ids) if target_id != source_id]
+    if not target_ids:
+        return jsonify({'error': 'No target staff members found'}), 404
+
+    # Un único INSERT ... ON CONFLICT para todos los pares (empleado, día)
+    now = datetime.utcnow()
+    rows = [
+        {
+            'staff_id': target_id,
+            'day_of_week': source_schedule.day_of_week,
+            'start_time': source_schedule.start_time,
+            'end_time': source_schedule.end_time,
+            'break_start': source_schedule.break_start,
+            'break_end': source_schedule.break_end,
+            'max_appointments': source_schedule.max_appointments,
+            'appointment_duration': source_schedule.appointment_duration,
+            'is_available': source_schedule.is_available,
+            'created_at': now,
+            'updated_at': now
+        }
+        for target_id in target_ids
+        for source_schedule in source_schedules
+    ]
+
+    table = StaffSchedule.__table__
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['staff_id', 'day_of_week'],
+        set_={column: stmt.excluded[column] for column in SCHEDULE_COPY_COLUMNS}
+    ).returning(literal_column('xmax = 0').label('inserted'))
+
+    # El upsert no pasa por el ORM: invalidar los huecos de los días copiados al confirmar
+    for row in rows:
+        slot_cache.mark_weekday(db.session, row['staff_id'], row['day_of_week'])
+
+    try:
+        results = db.session.execute(stmt).all()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error copying schedules', 'message': str(e)}), 500
+
+    # xmax = 0 indica que la fila se insertó; en otro caso la actualizó el ON CONFLICT
+    inserted_count = sum(1 for row in results if row.inserted)
+    updated_count = len(results) - inserted_count
 
     return jsonify({
-        'message': f'Copied schedules: {success_count} successful, {error_count} failed',
-        'success_count': success_count,
-        'error_count': error_count
-    }), 200 if success_count > 0 else 500
\ No newline at end of file
+        'message': f'Copied schedules: {inserted_count} inserted, {updated_count} updated',
+        'success_count': len(results),
+        'error_count': 0,
+        'inserted_count': inserted_count,
+        'updated_count': updated_count,
+        'target_count': len(target_ids)
+    }), 200
\ No newline at end of file
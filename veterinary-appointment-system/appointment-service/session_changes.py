@@ -0,0 +1,84 @@
+# appointment-service/session_changes.py
+from collections import Counter
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+def old_and_new(obj, attr):
+    """(valor anterior, valor nuevo) del atributo según el historial pendiente de flush."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        old = history.deleted[0]
+    elif history.unchanged:
+        old = history.unchanged[0]
+    else:
+        old = getattr(obj, attr)
+    new = history.added[0] if history.added else old
+    return old, new
+
+
+def track_deltas(info_key, collect, apply):
+    """Mantiene un contador derivado dentro de la misma transacción que los cambios del ORM.
+
+    Antes de cada flush collect(session, deltas) suma los incrementos en un
+    Counter y después del flush apply(connection, deltas) los escribe con la
+    conexión de la sesión. Si el flush falla, también dentro de un savepoint,
+    los incrementos pendientes se descartan.
+    """
+
+    @event.listens_for(Session, 'before_flush')
+    def _collect(session, flush_context, instances):
+        collect(session, session.info.setdefault(info_key, Counter()))
+
+    @event.listens_for(Session, 'after_flush')
+    def _apply(session, flush_context):
+        deltas = session.info.pop(info_key, None)
+        if deltas:
+            apply(session.connection(), deltas)
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def _discard(session, previous_transaction):
+        session.info.pop(info_key, None)
+
+
+def on_commit(info_key, apply):
+    """Acumula elementos que solo deben aplicarse si la transacción confirma.
+
+    Devuelve add(session, item). Cada elemento queda asociado al savepoint o
+    transacción en curso: si un savepoint hace rollback se descartan solo sus
+    elementos, y los demás se pasan juntos a apply(items) tras el commit.
+    """
+
+    def add(session, item):
+        transaction = session.get_nested_transaction() or session.get_transaction()
+        session.info.setdefault(info_key, []).append((transaction, item))
+
+    @event.listens_for(Session, 'after_commit')
+    def _apply(session):
+        pending = session.info.pop(info_key, None)
+        if pending:
+            apply([item for _, item in pending])
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def _discard(session, previous_transaction):
+        pending = session.info.get(info_key)
+        if not pending:
+            return
+        if previous_transaction.parent is None:
+            session.info.pop(info_key)
+        else:
+            session.info[info_key] = [
+                (transaction, item) for transaction, item in pending
+                if not _within(transaction, previous_transaction)
+            ]
+
+    return add
+
+
+def _within(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
@@ -0,0 +1,113 @@
+# appointment-service/slot_cache.py
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from models import Appointment, StaffSchedule, VeterinarianAvailability
+from session_changes import old_and_new, on_commit
+
+_MISSING = object()
+
+
+class SlotCache:
+    """Caché de huecos libres por (veterinario, fecha, duración).
+
+    Las entradas se invalidan al confirmar cualquier transacción que toque
+    ese veterinario-día: citas nuevas, modificadas o canceladas, y cambios de
+    horario (que afectan a todas las fechas de ese día de la semana). Los
+    cambios hechos fuera del ORM se registran con mark_day / mark_weekday.
+
+    Un contador por veterinario evita guardar un resultado calculado antes
+    de una invalidación concurrente. La caché es local al proceso; el TTL
+    acota cuánto puede tardar otro proceso en ver un cambio.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._cache = TTLCache()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SLOT_CACHE_ENABLED', True)
+        self._cache = TTLCache(
+            maxsize=app.config.get('SLOT_CACHE_MAXSIZE', 10000),
+            ttl=app.config.get('SLOT_CACHE_TTL_SECONDS', 300)
+        )
+
+    def get_slots(self, veterinarian_id, day, duration, compute):
+        """Huecos en caché o, si no están, el resultado de compute(), que se guarda."""
+        if not self.enabled:
+            return compute()
+
+        key = (veterinarian_id, day, duration)
+        slots = self._cache.get(key, _MISSING)
+        if slots is not _MISSING:
+            return slots
+
+        generation = self._generations.get(veterinarian_id, 0)
+        slots = compute()
+
+        with self._lock:
+            if self._generations.get(veterinarian_id, 0) == generation:
+                self._cache.set(key, slots)
+        return slots
+
+    def invalidate_day(self, veterinarian_id, day):
+        self._invalidate(veterinarian_id, lambda key: key[1] == day)
+
+    def invalidate_weekday(self, veterinarian_id, day_of_week):
+        self._invalidate(veterinarian_id, lambda key: key[1].weekday() == day_of_week)
+
+    def _invalidate(self, veterinarian_id, matches):
+        with self._lock:
+            self._generations[veterinarian_id] = self._generations.get(veterinarian_id, 0) + 1
+            self._cache.pop_where(lambda key, value: key[0] == veterinarian_id and matches(key))
+
+    def mark_day(self, session, veterinarian_id, day):
+        """Invalida el veterinario-día cuando la sesión confirme."""
+        _pending_invalidations(session, ('day', veterinarian_id, day))
+
+    def mark_weekday(self, session, veterinarian_id, day_of_week):
+        """Invalida ese día de la semana del veterinario cuando la sesión confirme."""
+        _pending_invalidations(session, ('weekday', veterinarian_id, day_of_week))
+
+    def stats(self):
+        return dict(self._cache.stats(), enabled=self.enabled)
+
+
+slot_cache = SlotCache()
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_slot_invalidations(session, flush_context, instances):
+    if not slot_cache.enabled:
+        return
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Appointment):
+            for vet_id, day in zip(old_and_new(obj, 'veterinarian_id'), old_and_new(obj, 'appointment_date')):
+                slot_cache.mark_day(session, vet_id, day)
+        elif isinstance(obj, StaffSchedule):
+            for staff_id, day_of_week in zip(old_and_new(obj, 'staff_id'), old_and_new(obj, 'day_of_week')):
+                slot_cache.mark_weekday(session, staff_id, day_of_week)
+        elif isinstance(obj, VeterinarianAvailability):
+            for vet_id, day_of_week in zip(old_and_new(obj, 'veterinarian_id'), old_and_new(obj, 'day_of_week')):
+                slot_cache.mark_weekday(session, vet_id, day_of_week)
+
+
+def _apply_slot_invalidations(pending):
+    for kind, veterinarian_id, value in set(pending):
+        if kind == 'day':
+            slot_cache.invalidate_day(veterinarian_id, value)
+        else:
+            slot_cache.invalidate_weekday(veterinarian_id, value)
+
+
+# Un savepoint fallido de un lote descarta solo sus invalidaciones, no las de las operaciones anteriores
+_pending_invalidations = on_commit('slot_cache_pending', _apply_slot_invalidations)
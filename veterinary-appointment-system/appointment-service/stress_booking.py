@@ -0,0 +1,66 @@
+# stress_booking.py
+# Prueba de concurrencia: muchos hilos intentan reservar el mismo hueco a la vez.
+# Debe crearse exactamente una cita; el resto debe recibir 409.
+# Uso: python stress_booking.py --token <jwt> --client 3 --vet 1 --pet 1 --date 2030-01-07 --time 10:00
+
+import argparse
+import sys
+import threading
+from collections import Counter
+
+import requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reservas concurrentes sobre un mismo hueco')
+    parser.add_argument('--url', default='http://localhost:5002')
+    parser.add_argument('--token', required=True)
+    parser.add_argument('--client', type=int, required=True)
+    parser.add_argument('--vet', type=int, required=True)
+    parser.add_argument('--pet', type=int, required=True)
+    parser.add_argument('--date', required=True)
+    parser.add_argument('--time', required=True)
+    parser.add_argument('--threads', type=int, default=50)
+    args = parser.parse_args()
+
+    payload = {
+        'client_id': args.client,
+        'veterinarian_id': args.vet,
+        'pet_id': args.pet,
+        'appointment_date': args.date,
+        'appointment_time': args.time,
+        'reason': 'Prueba de concurrencia'
+    }
+    headers = {'Authorization': f'Bearer {args.token}'}
+
+    # Todos los hilos salen a la vez para maximizar la contención
+    barrier = threading.Barrier(args.threads)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def attempt():
+        barrier.wait()
+        try:
+            status = requests.post(f'{args.url}/api/appointments/appointments',
+                                   json=payload, headers=headers, timeout=30).status_code
+        except requests.RequestException:
+            status = 'error'
+        with lock:
+            statuses[status] += 1
+
+    threads = [threading.Thread(target=attempt) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(dict(statuses))
+
+    if statuses[201] != 1 or statuses[409] != args.threads - 1:
+        print('FALLO: se esperaba una reserva creada y el resto en conflicto (409)')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# appointment-service/token_verifier.py
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+import jwt
+import requests
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenVerifier:
+    """Verifica los JWT emitidos por auth-service dentro del propio proceso.
+
+    La firma, la expiración y las claims (rol y estado activo) se comprueban
+    localmente. Para cubrir desactivaciones y cambios de rol antes de que el
+    token expire se consulta periódicamente la lista corta de revocaciones
+    que publica auth-service en /api/auth/revocations.
+
+    Cuando la verificación debe delegarse en auth-service, los resultados se
+    guardan en una caché TTL/LRU indexada por el hash del token, que
+    auth-service invalida al desactivar o modificar a un usuario.
+    """
+
+    def __init__(self, app=None):
+        self.secret_key = None
+        self.auth_service_url = None
+        self.refresh_seconds = 30
+        self.revocation_retention_seconds = 24 * 3600
+        self._revoked = {}
+        self._revoked_loaded_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._revoked_lock = threading.Lock()
+        self._cache = TTLCache()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.secret_key = app.config.get('JWT_SECRET_KEY')
+        self.auth_service_url = app.config.get('AUTH_SERVICE_URL')
+        self.refresh_seconds = app.config.get('TOKEN_REVOCATION_REFRESH_SECONDS', 30)
+        # Vida máxima de un token: las revocaciones más antiguas ya no afectan a ninguno
+        self.revocation_retention_seconds = app.config.get('TOKEN_REVOCATION_RETENTION_SECONDS', 24 * 3600)
+        self._cache = TTLCache(
+            maxsize=app.config.get('TOKEN_CACHE_MAXSIZE', 4096),
+            ttl=app.config.get('TOKEN_CACHE_TTL_SECONDS', 60)
+        )
+
+    def verify(self, token):
+        """Devuelve {'user_id', 'role', 'is_active'} si el token es válido, o None."""
+        if not token:
+            return None
+
+        # Sin clave compartida no es posible validar la firma localmente
+        if not self.secret_key:
+            return self._verify_remote(token)
+
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=['HS256'],
+                                 options={'require': ['exp', 'iat', 'sub']})
+        except jwt.InvalidTokenError:
+            return None
+
+        if payload.get('type', 'access') != 'access':
+            return None
+
+        # Tokens emitidos antes de incluir las claims de usuario
+        if 'role' not in payload or 'active' not in payload:
+            return self._verify_remote(token)
+
+        try:
+            user_id = int(payload['sub'])
+        except (TypeError, ValueError):
+            return None
+
+        # issued_at lleva decimales; los tokens anteriores a esa claim solo tienen iat en segundos
+        issued_at = payload.get('issued_at', payload['iat'])
+        if not isinstance(issued_at, (int, float)):
+            return None
+
+        if not payload['active'] or self._is_revoked(user_id, issued_at):
+            return None
+
+        return {'user_id': user_id, 'role': payload['role'], 'is_active': True}
+
+    def invalidate_user(self, user_id):
+        """Descarta las verificaciones en caché de un usuario y rechaza sus tokens actuales."""
+        with self._revoked_lock:
+            self._revoked = {**self._revoked, user_id: max(self._revoked.get(user_id, 0), time.time())}
+        return self._cache.pop_where(lambda token_hash, current_user: current_user['user_id'] == user_id)
+
+    def cache_stats(self):
+        return self._cache.stats()
+
+    def _is_revoked(self, user_id, issued_at):
+        revoked_before = self._revocations().get(user_id)
+        return revoked_before is not None and issued_at < revoked_before
+
+    def _revocations(self):
+        if time.monotonic() - self._revoked_loaded_at >= self.refresh_seconds:
+            # Solo un hilo refresca la lista; el resto usa la copia vigente
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._refresh_revocations()
+                finally:
+                    self._refresh_lock.release()
+        return self._revoked
+
+    def _refresh_revocations(self):
+        try:
+            response = requests.get(f"{self.auth_service_url}/api/auth/revocations",
+                                    headers={'Authorization': f'Bearer {self._service_token()}'}, timeout=2)
+            response.raise_for_status()
+            entries = response.json().get('revocations', [])
+            # Se fusiona con la copia vigente: una invalidación recibida por invalidate_user
+            # puede ser posterior a la instantánea que devolvió auth-service
+            oldest = time.time() - self.revocation_retention_seconds
+            with self._revoked_lock:
+                revoked = {user_id: before for user_id, before in self._revoked.items() if before >= oldest}
+                for entry in entries:
+                    revoked[entry['user_id']] = max(revoked.get(entry['user_id'], 0), entry['revoked_before'])
+                self._revoked = revoked
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning('Could not refresh token revocation list: %s', e)
+        finally:
+            self._revoked_loaded_at = time.monotonic()
+
+    def _service_token(self):
+        # Token de corta duración firmado con la clave compartida que identifica a este servicio
+        now = int(time.time())
+        return jwt.encode({
+            'sub': 'appointment-service', 'service': 'appointment-service', 'type': 'access',
+            'jti': str(uuid.uuid4()), 'iat': now, 'exp': now + 60
+        }, self.secret_key, algorithm='HS256')
+
+    def _verify_remote(self, token):
+        token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        current_user = self._cache.get(token_hash)
+        if current_user is not None:
+            return current_user
+
+        current_user = self._introspect(token)
+        if current_user is None:
+            return None
+
+        # La entrada nunca sobrevive a la expiración del propio token
+        try:
+            expires_at = jwt.decode(token, options={'verify_signature': False})['exp']
+            ttl = expires_at - time.time()
+        except (jwt.InvalidTokenError, KeyError, TypeError):
+            ttl = None
+
+        self._cache.set(token_hash, current_user, ttl=ttl)
+        return current_user
+
+    def _introspect(self, token):
+        # Una sola llamada devuelve validez, usuario, rol y estado activo
+        headers = {'Authorization': f'Bearer {token}'}
+        try:
+            response = requests.get(f"{self.auth_service_url}/api/auth/introspect", headers=headers, timeout=5)
+        except requests.RequestException:
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        result = response.json()
+        if not result.get('valid'):
+            return None
+
+        return {'user_id': result['user_id'], 'role': result['role'], 'is_active': result['is_active']}
+
+
+token_verifier = TokenVerifier()
@@ -0,0 +1,54 @@
+# appointment-service/user_lookup.py
+import logging
+import os
+
+import requests
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Proyección pública de usuarios (nombre, email, rol...) resuelta en auth-service
+_cache = TTLCache(maxsize=10000, ttl=300)
+
+MAX_LOOKUP_IDS = 1000
+
+
+def lookup_users(user_ids, authorization):
+    """Devuelve {id: usuario} para los ids dados con, como mucho, una llamada a auth-service.
+
+    Los usuarios ya vistos se sirven desde una caché local con TTL. Los que no
+    pueden resolverse (auth-service caído o id inexistente) se omiten.
+    """
+    users = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        user = _cache.get(user_id)
+        if user is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user
+
+    if not missing:
+        return users
+
+    try:
+        response = requests.post(
+            f"{os.getenv('AUTH_SERVICE_URL')}/api/auth/users/lookup",
+            json={'ids': missing[:MAX_LOOKUP_IDS]},
+            headers={'Authorization': authorization},
+            timeout=5
+        )
+    except requests.RequestException as e:
+        logger.warning('Could not resolve users: %s', e)
+        return users
+
+    if response.status_code != 200:
+        logger.warning('User lookup failed with status %s', response.status_code)
+        return users
+
+    for user in response.json().get('users', []):
+        _cache.set(user['id'], user)
+        users[user['id']] = user
+
+    return users
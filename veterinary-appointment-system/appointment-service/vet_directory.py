@@ -0,0 +1,34 @@
+# appointment-service/vet_directory.py
+import logging
+import os
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_cache = {'etag': None, 'veterinarians': []}
+_lock = threading.Lock()
+
+
+def get_veterinarians():
+    """Veterinarios activos según auth-service, revalidando la copia local con ETag."""
+    headers = {}
+    if _cache['etag']:
+        headers['If-None-Match'] = _cache['etag']
+
+    try:
+        response = requests.get(f"{os.getenv('AUTH_SERVICE_URL')}/api/auth/veterinarians", headers=headers, timeout=5)
+    except requests.RequestException as e:
+        logger.warning('Could not refresh veterinarian directory: %s', e)
+        return _cache['veterinarians']
+
+    if response.status_code == 304:
+        return _cache['veterinarians']
+    if response.status_code != 200:
+        return _cache['veterinarians']
+
+    with _lock:
+        _cache['veterinarians'] = response.json().get('veterinarians', [])
+        _cache['etag'] = response.headers.get('ETag')
+    return _cache['veterinarians']
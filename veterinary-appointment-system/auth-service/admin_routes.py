@@ -1,9 +1,13 @@
 # auth-service/admin_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import Schema, fields, ValidationError, post_load
+import re
+import requests
 from models import User
 from db import db
+from user_counters import user_counters
+from bulk_import import iter_records, import_users, DEFAULT_BATCH_SIZE
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -25,8 +29,23 @@ class StaffSchema(Schema):
             data['is_active'] = True
         return data
 
+class ImportUserSchema(StaffSchema):
+    # La importación masiva admite también clientes
+    role = fields.Str(required=True,
+                      validate=lambda x: x in ['veterinarian', 'receptionist', 'assistant', 'admin', 'client'])
+
+
 # Instancias de schemas
 staff_schema = StaffSchema()
+import_user_schema = ImportUserSchema()
+
+# Paginación de listados de usuarios
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+USER_LIST_FIELDS = ('id', 'email', 'first_name', 'last_name', 'phone', 'role',
+                    'specialization', 'is_active', 'created_at', 'updated_at')
 
 
 # Middleware para verificar permisos de administrador
@@ -45,6 +64,89 @@ def admin_required(f):
     return decorated_function
 
 
+# Middleware para verificar que el usuario tenga alguno de los roles indicados
+def roles_required(*roles):
+    def decorator(f):
+        @jwt_required()
+        def decorated_function(*args, **kwargs):
+            current_user_id = get_jwt_identity()
+            user = User.query.get(current_user_id)
+
+            if not user or not user.is_active or user.role not in roles:
+                return jsonify({'error': 'Insufficient privileges'}), 403
+
+            return f(*args, **kwargs)
+
+        decorated_function.__name__ = f.__name__
+        return decorated_function
+
+    return decorator
+
+
+# Notificar a los servicios que cachean verificaciones de token que un usuario cambió
+def notify_user_invalidation(user_id):
+    url = current_app.config.get('APPOINTMENT_SERVICE_URL')
+    if not url:
+        return
+
+    try:
+        requests.post(
+            f'{url}/api/appointments/token-cache/invalidate',
+            json={'user_id': user_id},
+            headers={'Authorization': request.headers.get('Authorization', '')},
+            timeout=2
+        )
+    except requests.RequestException as e:
+        current_app.logger.warning(f'No se pudo invalidar la caché de tokens del usuario {user_id}: {e}')
+
+
+def paginated_user_list(query, collection_name):
+    """Página de usuarios por cursor (keyset sobre id) con proyección de columnas.
+
+    Parámetros: cursor (último id recibido), limit (máximo MAX_PAGE_SIZE),
+    fields (columnas separadas por comas) y count=false para omitir el total.
+    """
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor', type=int)
+    include_total = request.args.get('count', 'true').lower() != 'false'
+
+    fields = USER_LIST_FIELDS
+    if request.args.get('fields'):
+        requested = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        invalid = [field for field in requested if field not in USER_LIST_FIELDS]
+        if invalid:
+            return jsonify({'error': f'Invalid fields: {", ".join(invalid)}'}), 400
+        # El id siempre se incluye porque es el cursor
+        fields = ['id'] + [field for field in requested if field != 'id']
+
+    total = None
+    if include_total:
+        total = query.with_entities(db.func.count(User.id)).scalar()
+
+    if cursor is not None:
+        query = query.filter(User.id > cursor)
+
+    rows = query.with_entities(*[getattr(User, field) for field in fields]) \
+        .order_by(User.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        item = {}
+        for field, value in zip(fields, row):
+            item[field] = value.isoformat() if field in ('created_at', 'updated_at') and value else value
+        items.append(item)
+
+    return jsonify({
+        collection_name: items,
+        'next_cursor': rows[-1].id if has_more else None,
+        'has_more': has_more,
+        'total': total
+    }), 200
+
+
 # Rutas para administración de personal
 @admin_bp.route('/staff', methods=['POST'])
 @admin_required
@@ -85,6 +187,22 @@ def create_staff():
         return jsonify({'error': 'Error creating staff member', 'message': str(e)}), 500
 
 
+@admin_bp.route('/users/import', methods=['POST'])
+@admin_required
+def import_users_bulk():
+    """Importación masiva de personal y clientes desde CSV o NDJSON en el cuerpo de la petición"""
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if request.mimetype in ('text/csv', 'application/csv') else 'ndjson'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+
+    batch_size = min(max(request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int), 1), 5000)
+
+    report = import_users(iter_records(request.stream, fmt), import_user_schema, batch_size=batch_size)
+    return jsonify(report.to_dict()), 200
+
+
 @admin_bp.route('/staff', methods=['GET'])
 @admin_required
 def get_all_staff():
@@ -100,11 +218,7 @@ def get_all_staff():
         is_active_bool = is_active.lower() == 'true'
         query = query.filter_by(is_active=is_active_bool)
 
-    staff = query.all()
-
-    return jsonify({
-        'staff': [user.to_dict() for user in staff]
-    }), 200
+    return paginated_user_list(query, 'staff')
 
 
 @admin_bp.route('/staff/<int:user_id>', methods=['GET'])
@@ -157,8 +271,12 @@ def update_staff_member(user_id):
     if 'is_active' in data:
         user.is_active = data['is_active']
 
+    access_changed = 'role' in data or 'is_active' in data
+
     try:
         db.session.commit()
+        if access_changed:
+            notify_user_invalidation(user.id)
         return jsonify({
             'message': 'Staff member updated successfully',
             'user': user.to_dict()
@@ -181,6 +299,7 @@ def delete_staff_member(user_id):
 
     try:
         db.session.commit()
+        notify_user_invalidation(user.id)
         return jsonify({'message': 'Staff member deactivated successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -199,11 +318,57 @@ def get_all_clients():
         is_active_bool = is_active.lower() == 'true'
         query = query.filter_by(is_active=is_active_bool)
 
-    clients = query.all()
+    return paginated_user_list(query, 'clients')
 
-    return jsonify({
-        'clients': [user.to_dict() for user in clients]
-    }), 200
+
+@admin_bp.route('/clients/search', methods=['GET'])
+@roles_required('admin', 'receptionist')
+def search_clients():
+    """Búsqueda de clientes por nombre, email o teléfono, ordenada por relevancia.
+
+    Se apoya en los índices trigram de init.sql: las coincidencias por prefijo
+    van primero y el resto se ordena por similitud.
+    """
+    q = request.args.get('q', '').strip()
+    if len(q) < 2:
+        return jsonify({'error': 'Search query must have at least 2 characters'}), 400
+
+    limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    is_active = request.args.get('is_active')
+
+    # Escapar comodines de LIKE en el texto del usuario
+    escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    contains = f'%{escaped}%'
+    prefix = f'{escaped}%'
+
+    # Mismas expresiones que los índices de init.sql
+    full_name = User.first_name + ' ' + User.last_name
+    phone_digits = db.func.regexp_replace(User.phone, '[^0-9]', '', 'g')
+
+    conditions = [full_name.ilike(contains), User.email.ilike(contains)]
+    digits = re.sub(r'[^0-9]', '', q)
+    if len(digits) >= 3:
+        conditions.append(phone_digits.like(f'%{digits}%'))
+
+    is_prefix = db.or_(User.first_name.ilike(prefix), User.last_name.ilike(prefix), User.email.ilike(prefix))
+    similarity = db.func.greatest(db.func.similarity(full_name, q), db.func.similarity(User.email, q))
+
+    query = User.query.filter(User.role == 'client', db.or_(*conditions))
+    if is_active is not None:
+        query = query.filter(User.is_active == (is_active.lower() == 'true'))
+
+    rows = query.with_entities(*[getattr(User, field) for field in USER_LIST_FIELDS]) \
+        .order_by(db.case((is_prefix, 0), else_=1), similarity.desc(), User.id) \
+        .limit(limit).all()
+
+    clients = []
+    for row in rows:
+        client = dict(row._mapping)
+        for field in ('created_at', 'updated_at'):
+            client[field] = client[field].isoformat() if client[field] else None
+        clients.append(client)
+
+    return jsonify({'clients': clients}), 200
 
 
 @admin_bp.route('/clients/<int:user_id>', methods=['GET'])
@@ -233,6 +398,8 @@ def update_client(user_id):
 
     try:
         db.session.commit()
+        if 'is_active' in data:
+            notify_user_invalidation(user.id)
         return jsonify({
             'message': 'Client updated successfully',
             'client': user.to_dict()
@@ -246,11 +413,18 @@ def update_client(user_id):
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @admin_required
 def get_dashboard_stats():
-    # Contar usuarios por rol
-    total_vets = User.query.filter_by(role='veterinarian', is_active=True).count()
-    total_receptionists = User.query.filter_by(role='receptionist', is_active=True).count()
-    total_assistants = User.query.filter_by(role='assistant', is_active=True).count()
-    total_clients = User.query.filter_by(role='client', is_active=True).count()
+    # Contar usuarios por rol: contadores mantenidos o un único GROUP BY
+    if user_counters.enabled:
+        counts = user_counters.read()
+    else:
+        rows = db.session.query(User.role, User.is_active, db.func.count(User.id)) \
+            .group_by(User.role, User.is_active).all()
+        counts = {(role, is_active): count for role, is_active, count in rows}
+
+    total_vets = counts.get(('veterinarian', True), 0)
+    total_receptionists = counts.get(('receptionist', True), 0)
+    total_assistants = counts.get(('assistant', True), 0)
+    total_clients = counts.get(('client', True), 0)
 
     return jsonify({
         'staff_stats': {
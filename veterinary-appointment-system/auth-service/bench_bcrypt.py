@@ -0,0 +1,52 @@
+# bench_bcrypt.py
+# Mide inicios de sesión por segundo (verificaciones bcrypt) según el número de procesos del pool.
+# Uso: python bench_bcrypt.py [--rounds 12] [--logins 64] [--threads 16]
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from password_hasher import PasswordHasher
+
+
+def run(pool_size, rounds, logins, threads):
+    hasher = PasswordHasher(rounds=rounds, pool_size=pool_size)
+    hashed = hasher.hash('benchmark-password')
+
+    # Calentar el pool para no medir el arranque de los procesos
+    hasher.check('benchmark-password', hashed)
+
+    # Los hilos simulan las peticiones concurrentes que atiende el servidor
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda _: hasher.check('benchmark-password', hashed), range(logins)))
+    elapsed = time.perf_counter() - start
+
+    hasher.shutdown()
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de bcrypt por tamaño de pool')
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    pool_sizes = [0] + sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+
+    print(f'bcrypt rounds={args.rounds}, logins={args.logins}, threads={args.threads}, cores={cores}')
+    print(f'{"pool":>6} {"logins/s":>10}')
+    for pool_size in pool_sizes:
+        label = 'inline' if pool_size == 0 else str(pool_size)
+        print(f'{label:>6} {run(pool_size, args.rounds, args.logins, args.threads):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
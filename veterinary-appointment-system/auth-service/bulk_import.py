@@ -0,0 +1,162 @@
+# auth-service/bulk_import.py
+import csv
+import io
+import json
+import time
+from collections import Counter
+
+from marshmallow import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+
+from db import db
+from models import User
+from password_hasher import password_hasher
+from user_counters import user_counters
+from vet_directory import vet_directory
+
+DEFAULT_PASSWORD = 'changeme123'
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_records(stream, fmt):
+    """Lee el flujo fila a fila y produce (número de fila, registro o None, error o None)."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            # Las celdas vacías se tratan como campos ausentes
+            yield row_number, {key: value for key, value in row.items() if key and value not in (None, '')}, None
+        return
+
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, {'_row': [f'Invalid JSON: {e}']}
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, {'_row': ['Each line must be a JSON object']}
+            continue
+        yield row_number, record, None
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.started_at = time.perf_counter()
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.processed / elapsed, 1) if elapsed else None
+        }
+
+
+def import_users(records, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Valida e inserta usuarios por lotes; una fila inválida no detiene la importación.
+
+    Cada lote se valida con `schema`, hashea sus contraseñas en el pool de
+    bcrypt y se inserta con un único INSERT multi-fila que ignora los emails
+    ya registrados.
+    """
+    report = ImportReport()
+    batch = []
+
+    for row_number, record, error in records:
+        report.processed += 1
+        if error:
+            report.add_error(row_number, error)
+            continue
+
+        batch.append((row_number, record))
+        if len(batch) >= batch_size:
+            _import_batch(batch, schema, report)
+            batch = []
+
+    if batch:
+        _import_batch(batch, schema, report)
+
+    return report
+
+
+def _import_batch(batch, schema, report):
+    valid = []
+    seen_emails = set()
+
+    for row_number, record in batch:
+        try:
+            data = schema.load(record)
+        except ValidationError as err:
+            report.add_error(row_number, err.messages)
+            continue
+
+        email = data['email'].lower()
+        if email in seen_emails:
+            report.add_error(row_number, {'email': ['Duplicated in import']})
+            continue
+        seen_emails.add(email)
+        valid.append((row_number, data))
+
+    if not valid:
+        return
+
+    # La contraseña por defecto es conocida, así que basta con hashearla una vez por lote
+    explicit = [data['password'] for _, data in valid if data.get('password')]
+    hashed_explicit = iter(password_hasher.hash_many(explicit))
+    default_hash = password_hasher.hash(DEFAULT_PASSWORD) if len(explicit) < len(valid) else None
+
+    rows = []
+    for _, data in valid:
+        rows.append({
+            'email': data['email'],
+            'password': next(hashed_explicit) if data.get('password') else default_hash,
+            'first_name': data['first_name'],
+            'last_name': data['last_name'],
+            'phone': data.get('phone'),
+            'role': data['role'],
+            'specialization': data.get('specialization') if data['role'] == 'veterinarian' else None,
+            'is_active': data.get('is_active', True)
+        })
+
+    stmt = insert(User.__table__).values(rows) \
+        .on_conflict_do_nothing(index_elements=['email']) \
+        .returning(User.__table__.c.email)
+
+    try:
+        inserted = {email for (email,) in db.session.execute(stmt)}
+
+        deltas = Counter((row['role'], row['is_active']) for row in rows if row['email'] in inserted)
+        user_counters.apply(db.session.connection(), deltas)
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for row_number, _ in valid:
+            report.add_error(row_number, {'_row': [f'Database error: {e}']})
+        return
+
+    for (row_number, data), row in zip(valid, rows):
+        if row['email'] in inserted:
+            report.created += 1
+        else:
+            report.add_error(row_number, {'email': ['User already exists']})
+
+    if any(row['role'] != 'client' and row['email'] in inserted for row in rows):
+        vet_directory.invalidate()
@@ -6,6 +6,8 @@ from datetime import timedelta
 import os
 from dotenv import load_dotenv
 from db import db  # Importar la instancia singleton
+from password_hasher import password_hasher
+from user_counters import user_counters
 
 load_dotenv()
 
@@ -20,10 +22,17 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+    app.config['APPOINTMENT_SERVICE_URL'] = os.getenv('APPOINTMENT_SERVICE_URL')
+    app.config['BCRYPT_ROUNDS'] = int(os.getenv('BCRYPT_ROUNDS', 12))
+    app.config['BCRYPT_POOL_SIZE'] = int(os.getenv('BCRYPT_POOL_SIZE', os.cpu_count() or 1))
+    app.config['VET_DIRECTORY_MAX_AGE'] = int(os.getenv('VET_DIRECTORY_MAX_AGE', 60))
+    app.config['USER_COUNTERS_ENABLED'] = os.getenv('USER_COUNTERS_ENABLED', 'false').lower() == 'true'
 
     # Inicializar extensiones
     db.init_app(app)
     jwt.init_app(app)
+    password_hasher.init_app(app)
+    user_counters.init_app(app)
     CORS(app)
 
     # Configurar JWT callbacks
@@ -58,6 +67,9 @@ def create_app():
         from routes import auth_bp
         app.register_blueprint(auth_bp, url_prefix='/api/auth')
 
+        from vet_directory import vet_directory
+        vet_directory.max_age = app.config['VET_DIRECTORY_MAX_AGE']
+
         # Registrar rutas de administrador
         from admin_routes import admin_bp
         app.register_blueprint(admin_bp, url_prefix='/api/admin')
@@ -0,0 +1,46 @@
+# import_users.py
+# Importación masiva de personal y clientes desde un archivo CSV o NDJSON.
+# Uso: python import_users.py usuarios.csv [--format csv|ndjson] [--batch-size 500]
+#
+# Columnas/campos: email, password, first_name, last_name, phone, role, specialization, is_active
+
+import argparse
+import json
+import os
+import sys
+
+# Añadir directorio actual al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from create_app import create_app
+from bulk_import import iter_records, import_users, DEFAULT_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importar usuarios en bloque')
+    parser.add_argument('path', help='Archivo CSV o NDJSON')
+    parser.add_argument('--format', choices=['csv', 'ndjson'])
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+
+    app = create_app()
+    with app.app_context():
+        from admin_routes import import_user_schema
+
+        with open(args.path, 'rb') as stream:
+            report = import_users(iter_records(stream, fmt), import_user_schema, batch_size=args.batch_size)
+
+    summary = report.to_dict()
+    print(f"Filas procesadas: {summary['processed']}")
+    print(f"Usuarios creados: {summary['created']}")
+    print(f"Filas con errores: {summary['failed']}")
+    print(f"Velocidad: {summary['rows_per_second']} filas/s")
+
+    for error in summary['errors']:
+        print(f"  Fila {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 # auth-service/models.py
 from datetime import datetime
-import bcrypt
 from db import db  # Importar desde db.py
+from password_hasher import password_hasher
 
 
 class User(db.Model):
@@ -20,10 +20,13 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def set_password(self, password):
-        self.password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password.encode('utf-8'))
+        return password_hasher.check(password, self.password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password)
 
     def to_dict(self):
         return {
@@ -37,4 +40,18 @@ class User(db.Model):
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+class UserRoleCounter(db.Model):
+    __tablename__ = 'user_role_counters'
+
+    role = db.Column(db.String(50), primary_key=True)
+    is_active = db.Column(db.Boolean, primary_key=True)
+    user_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'role': self.role,
+            'is_active': self.is_active,
+            'user_count': self.user_count
+        }
@@ -0,0 +1,76 @@
+# auth-service/password_hasher.py
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        # Hash almacenado con un formato que bcrypt no reconoce
+        return False
+
+
+class PasswordHasher:
+    """Ejecuta bcrypt en un pool de procesos para no ocupar los hilos de las peticiones.
+
+    Con BCRYPT_POOL_SIZE = 0 el trabajo se hace en el propio hilo, como antes.
+    BCRYPT_ROUNDS fija el coste de los hashes nuevos; los hashes almacenados
+    con otro coste se detectan con needs_rehash().
+    """
+
+    def __init__(self, app=None, rounds=12, pool_size=0):
+        self.rounds = rounds
+        self.pool_size = pool_size
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_ROUNDS', self.rounds)
+        self.pool_size = app.config.get('BCRYPT_POOL_SIZE', self.pool_size)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+        return self._executor
+
+    def hash(self, password):
+        if self.pool_size <= 0:
+            return _hash(password, self.rounds)
+        return self._get_executor().submit(_hash, password, self.rounds).result()
+
+    def hash_many(self, passwords):
+        if self.pool_size <= 0:
+            return [_hash(password, self.rounds) for password in passwords]
+        return list(self._get_executor().map(_hash, passwords, [self.rounds] * len(passwords)))
+
+    def check(self, password, hashed):
+        if self.pool_size <= 0:
+            return _check(password, hashed)
+        return self._get_executor().submit(_check, password, hashed).result()
+
+    def needs_rehash(self, hashed):
+        # Formato bcrypt: $2b$<coste>$<sal+hash>. Solo se sube el coste, nunca se baja
+        try:
+            return int(hashed.split('$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
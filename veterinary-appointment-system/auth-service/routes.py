@@ -1,9 +1,14 @@
 # auth-service/routes.py (CORREGIDO)
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, Response
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity, decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import ExpiredSignatureError, InvalidTokenError
 from marshmallow import Schema, fields, ValidationError
+from datetime import datetime, timezone
+import time
 from models import User
 from db import db
+from vet_directory import vet_directory
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -22,11 +27,28 @@ class UserLoginSchema(Schema):
     password = fields.Str(required=True)
 
 
+MAX_INTROSPECT_TOKENS = 100
+MAX_USER_LOOKUP_IDS = 1000
+STAFF_ROLES = ('admin', 'veterinarian', 'receptionist', 'assistant')
+
+# Columnas devueltas por la búsqueda de usuarios por lote (sin datos sensibles)
+USER_LOOKUP_COLUMNS = (User.id, User.email, User.first_name, User.last_name, User.phone,
+                       User.role, User.specialization, User.is_active)
+
 # Instancias de schemas
 register_schema = UserRegisterSchema()
 login_schema = UserLoginSchema()
 
 
+def issue_access_token(user):
+    # Las claims permiten a los demás servicios validar el token sin consultar este servicio.
+    # issued_at conserva los decimales que iat pierde, para compararlo con revoked_before
+    return create_access_token(
+        identity=str(user.id),
+        additional_claims={'role': user.role, 'active': user.is_active, 'issued_at': time.time()}
+    )
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     try:
@@ -64,7 +86,7 @@ def register():
         db.session.commit()
 
         # Crear token de acceso
-        access_token = create_access_token(identity=str(user.id))
+        access_token = issue_access_token(user)
 
         return jsonify({
             'message': 'Usuario creado exitosamente',
@@ -100,8 +122,18 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'La cuenta está inactiva. Contacte al administrador'}), 403
 
+        # Actualizar de forma transparente los hashes con un coste menor al configurado.
+        # El trigger de users actualiza updated_at, así que /revocations invalida los
+        # demás tokens del personal; ocurre una sola vez por cada subida de coste
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
         # Crear token de acceso
-        access_token = create_access_token(identity=str(user.id))
+        access_token = issue_access_token(user)
 
         return jsonify({
             'message': 'Inicio de sesión exitoso',
@@ -143,16 +175,91 @@ def get_user(user_id):
         return jsonify({'error': 'Error al obtener usuario', 'message': str(e)}), 500
 
 
+def lookup_users(user_ids):
+    """Resuelve la proyección pública de varios usuarios con una sola consulta IN."""
+    rows = db.session.query(*USER_LOOKUP_COLUMNS).filter(User.id.in_(user_ids)).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def parse_user_ids(values):
+    # Enteros sin duplicados, conservando el orden recibido
+    return list(dict.fromkeys(int(value) for value in values))
+
+
+@auth_bp.route('/users', methods=['GET'])
+@jwt_required()
+def get_users():
+    """Búsqueda por lote: /api/auth/users?ids=1,2,3"""
+    try:
+        user_ids = parse_user_ids(value for value in request.args.get('ids', '').split(',') if value.strip())
+    except ValueError:
+        return jsonify({'error': 'ids debe ser una lista de enteros separados por comas'}), 400
+
+    if not user_ids:
+        return jsonify({'error': 'No se especificaron ids'}), 400
+    if len(user_ids) > MAX_USER_LOOKUP_IDS:
+        return jsonify({'error': f'Máximo {MAX_USER_LOOKUP_IDS} ids por petición'}), 400
+
+    try:
+        return jsonify({'users': lookup_users(user_ids)}), 200
+    except Exception as e:
+        return jsonify({'error': 'Error al obtener usuarios', 'message': str(e)}), 500
+
+
+@auth_bp.route('/users/lookup', methods=['POST'])
+@jwt_required()
+def lookup_users_batch():
+    """Variante de /users para conjuntos grandes: {"ids": [1, 2, 3]} en el cuerpo"""
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if not isinstance(ids, list):
+        return jsonify({'error': 'ids debe ser una lista de enteros'}), 400
+
+    try:
+        user_ids = parse_user_ids(ids)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'ids debe ser una lista de enteros'}), 400
+
+    if len(user_ids) > MAX_USER_LOOKUP_IDS:
+        return jsonify({'error': f'Máximo {MAX_USER_LOOKUP_IDS} ids por petición'}), 400
+
+    try:
+        return jsonify({'users': lookup_users(user_ids) if user_ids else []}), 200
+    except Exception as e:
+        return jsonify({'error': 'Error al obtener usuarios', 'message': str(e)}), 500
+
+
+@auth_bp.route('/staff-ids', methods=['GET'])
+@jwt_required()
+def get_staff_ids():
+    """Ids del personal activo con un rol: /api/auth/staff-ids?role=veterinarian
+
+    Pensado para llamadas entre servicios; basta con un token válido.
+    """
+    role = request.args.get('role')
+    if role not in STAFF_ROLES:
+        return jsonify({'error': f'role debe ser uno de: {", ".join(STAFF_ROLES)}'}), 400
+
+    try:
+        rows = db.session.query(User.id).filter(User.role == role, User.is_active.is_(True)) \
+            .order_by(User.id).all()
+        return jsonify({'ids': [user_id for user_id, in rows]}), 200
+    except Exception as e:
+        return jsonify({'error': 'Error al obtener el personal', 'message': str(e)}), 500
+
+
 @auth_bp.route('/veterinarians', methods=['GET'])
 def get_veterinarians():
     try:
-        veterinarians = User.query.filter_by(role='veterinarian', is_active=True).all()
-        return jsonify({
-            'veterinarians': [vet.to_dict() for vet in veterinarians]
-        }), 200
+        body, etag = vet_directory.get()
     except Exception as e:
         return jsonify({'error': 'Error al obtener veterinarios', 'message': str(e)}), 500
 
+    # Con If-None-Match vigente se responde 304 sin cuerpo
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
 
 @auth_bp.route('/verify-token', methods=['GET'])
 @jwt_required()
@@ -169,6 +276,111 @@ def verify_token():
         return jsonify({'valid': False, 'message': str(e)}), 401
 
 
+def introspect_tokens(tokens):
+    """Valida varios tokens resolviendo a todos sus usuarios con una sola consulta."""
+    results = []
+    user_ids = set()
+
+    for token in tokens:
+        try:
+            payload = decode_token(token)
+            user_id = int(payload['sub'])
+        except ExpiredSignatureError:
+            results.append({'valid': False, 'reason': 'expired'})
+            continue
+        except (InvalidTokenError, JWTExtendedException, KeyError, TypeError, ValueError):
+            results.append({'valid': False, 'reason': 'invalid'})
+            continue
+
+        results.append({'valid': True, 'user_id': user_id})
+        user_ids.add(user_id)
+
+    users = {}
+    if user_ids:
+        users = {
+            user.id: user
+            for user in User.query.filter(User.id.in_(user_ids)).with_entities(User.id, User.role, User.is_active)
+        }
+
+    for result in results:
+        if not result['valid']:
+            continue
+
+        user = users.get(result['user_id'])
+        if not user or not user.is_active:
+            result.update({'valid': False, 'reason': 'inactive'})
+        else:
+            result.update({'role': user.role, 'is_active': True})
+
+    return results
+
+
+@auth_bp.route('/introspect', methods=['GET', 'POST'])
+def introspect():
+    """Validez, usuario, rol y estado activo de uno o varios tokens en una sola llamada.
+
+    GET valida el token de la cabecera Authorization. POST acepta
+    {"token": "..."} o, en forma de lote, {"tokens": ["...", ...]}.
+    """
+    if request.method == 'GET':
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        if not token:
+            return jsonify({'error': 'No se proporcionó un token'}), 400
+        result = introspect_tokens([token])[0]
+        return jsonify(result), 200 if result['valid'] else 401
+
+    data = request.get_json(silent=True) or {}
+
+    if 'tokens' in data:
+        tokens = data['tokens']
+        if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+            return jsonify({'error': 'tokens debe ser una lista de cadenas'}), 400
+        if len(tokens) > MAX_INTROSPECT_TOKENS:
+            return jsonify({'error': f'Máximo {MAX_INTROSPECT_TOKENS} tokens por petición'}), 400
+        return jsonify({'results': introspect_tokens(tokens)}), 200
+
+    token = data.get('token')
+    if not isinstance(token, str) or not token:
+        return jsonify({'error': 'No se proporcionó un token'}), 400
+
+    result = introspect_tokens([token])[0]
+    return jsonify(result), 200 if result['valid'] else 401
+
+
+@auth_bp.route('/revocations', methods=['GET'])
+@jwt_required()
+def get_revocations():
+    """Lista corta de usuarios cuyos tokens vigentes dejaron de ser confiables.
+
+    Incluye al personal modificado y a los usuarios desactivados dentro del
+    periodo de vida de un token; los tokens emitidos antes de `revoked_before`
+    (segundos con decimales) deben rechazarse. Solo para otros servicios: el
+    token debe llevar la claim `service`.
+    """
+    if not get_jwt().get('service'):
+        return jsonify({'error': 'Se requiere un token de servicio'}), 403
+
+    try:
+        since = datetime.utcnow() - current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+        users = db.session.query(User.id, User.updated_at).filter(
+            User.updated_at >= since,
+            db.or_(User.is_active.is_(False), User.role != 'client')
+        ).all()
+
+        return jsonify({
+            'revocations': [
+                {
+                    'user_id': user_id,
+                    'revoked_before': updated_at.replace(tzinfo=timezone.utc).timestamp()
+                }
+                for user_id, updated_at in users
+            ],
+            'generated_at': datetime.utcnow().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': 'Error al obtener revocaciones', 'message': str(e)}), 500
+
+
 @auth_bp.route('/verify-role', methods=['GET'])
 @jwt_required()
 def verify_role():
@@ -0,0 +1,42 @@
+# auth-service/session_changes.py
+from collections import Counter
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+def old_and_new(obj, attr):
+    """(valor anterior, valor nuevo) del atributo según el historial pendiente de flush."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        old = history.deleted[0]
+    elif history.unchanged:
+        old = history.unchanged[0]
+    else:
+        old = getattr(obj, attr)
+    new = history.added[0] if history.added else old
+    return old, new
+
+
+def track_deltas(info_key, collect, apply):
+    """Mantiene un contador derivado dentro de la misma transacción que los cambios del ORM.
+
+    Antes de cada flush collect(session, deltas) suma los incrementos en un
+    Counter y después del flush apply(connection, deltas) los escribe con la
+    conexión de la sesión. Si el flush falla, también dentro de un savepoint,
+    los incrementos pendientes se descartan.
+    """
+
+    @event.listens_for(Session, 'before_flush')
+    def _collect(session, flush_context, instances):
+        collect(session, session.info.setdefault(info_key, Counter()))
+
+    @event.listens_for(Session, 'after_flush')
+    def _apply(session, flush_context):
+        deltas = session.info.pop(info_key, None)
+        if deltas:
+            apply(session.connection(), deltas)
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def _discard(session, previous_transaction):
+        session.info.pop(info_key, None)
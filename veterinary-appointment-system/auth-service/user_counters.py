@@ -0,0 +1,79 @@
+# auth-service/user_counters.py
+from sqlalchemy.dialects.postgresql import insert
+
+from models import User, UserRoleCounter
+from session_changes import old_and_new, track_deltas
+
+
+class UserCounters:
+    """Mantiene user_role_counters dentro de la misma transacción que modifica users.
+
+    Cada flush calcula cuántos usuarios entran o salen de cada par
+    (rol, activo) y aplica los incrementos con un upsert, de modo que el
+    panel de administración lee unas pocas filas sin importar el tamaño de
+    la tabla. Los contadores se mantienen siempre, para que sigan al día si
+    se activa la lectura más tarde; USER_COUNTERS_ENABLED solo decide si el
+    panel los lee.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('USER_COUNTERS_ENABLED', False)
+
+    def apply(self, connection, deltas):
+        """Suma los incrementos {(rol, activo): n} a los contadores."""
+        rows = [
+            {'role': role, 'is_active': is_active, 'user_count': delta}
+            for (role, is_active), delta in deltas.items() if delta
+        ]
+        if not rows:
+            return
+
+        stmt = insert(UserRoleCounter.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['role', 'is_active'],
+            set_={'user_count': UserRoleCounter.__table__.c.user_count + stmt.excluded.user_count}
+        )
+        connection.execute(stmt)
+
+    def read(self):
+        return {(row.role, row.is_active): row.user_count for row in UserRoleCounter.query.all()}
+
+
+user_counters = UserCounters()
+
+
+def _is_active(value):
+    # La columna tiene TRUE por defecto cuando aún no se ha asignado
+    return True if value is None else bool(value)
+
+
+def _collect_counter_deltas(session, deltas):
+    for obj in session.new:
+        if isinstance(obj, User):
+            deltas[(obj.role, _is_active(obj.is_active))] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            old_role, _ = old_and_new(obj, 'role')
+            old_active, _ = old_and_new(obj, 'is_active')
+            deltas[(old_role, _is_active(old_active))] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, User) and obj not in session.deleted:
+            old_role, new_role = old_and_new(obj, 'role')
+            old_active, new_active = old_and_new(obj, 'is_active')
+            old_key = (old_role, _is_active(old_active))
+            new_key = (new_role, _is_active(new_active))
+            if old_key != new_key:
+                deltas[old_key] -= 1
+                deltas[new_key] += 1
+
+
+track_deltas('user_counter_deltas', _collect_counter_deltas,
+             lambda connection, deltas: user_counters.apply(connection, deltas))
@@ -0,0 +1,77 @@
+# auth-service/vet_directory.py
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import User
+from session_changes import old_and_new
+
+
+class VeterinarianDirectory:
+    """Directorio de veterinarios activos serializado una sola vez por versión.
+
+    La versión se incrementa cuando se confirma un cambio sobre personal, lo
+    que invalida el JSON y el ETag cacheados. `max_age` acota además cuánto
+    puede sobrevivir una copia si el cambio llegó por otro proceso.
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self.version = 0
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._cached = None
+
+    def get(self):
+        """Devuelve (cuerpo JSON, etag) de la versión vigente, reconstruyéndolo si hace falta."""
+        cached = self._cached
+        if cached and cached['version'] == self.version and time.monotonic() - cached['built_at'] < self.max_age:
+            return cached['body'], cached['etag']
+
+        version = self.version
+        veterinarians = User.query.filter_by(role='veterinarian', is_active=True).order_by(User.id).all()
+        body = json.dumps({'veterinarians': [vet.to_dict() for vet in veterinarians]}, sort_keys=True)
+        etag = hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+
+        with self._lock:
+            # No guardar una copia si el directorio se invalidó mientras se construía
+            if version == self.version:
+                self._cached = {'version': version, 'body': body, 'etag': etag, 'built_at': time.monotonic()}
+
+        return body, etag
+
+
+vet_directory = VeterinarianDirectory()
+
+
+def _is_staff(obj):
+    # Cuenta el rol anterior: un veterinario degradado a cliente también cambia el directorio
+    roles = old_and_new(obj, 'role')
+    return any(role != 'client' for role in roles)
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_staff_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and _is_staff(obj):
+            session.info['staff_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('staff_changed', False):
+        vet_directory.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('staff_changed', None)
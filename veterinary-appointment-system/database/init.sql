@@ -76,15 +76,20 @@ CREATE INDEX idx_appointments_date ON appointments(appointment_date);
 CREATE INDEX idx_appointments_client ON appointments(client_id);
 CREATE INDEX idx_appointments_veterinarian ON appointments(veterinarian_id);
 CREATE INDEX idx_appointments_status ON appointments(status);
+CREATE INDEX idx_appointments_date_time_id ON appointments(appointment_date, appointment_time, id);
+CREATE INDEX idx_appointments_vet_date_time_id ON appointments(veterinarian_id, appointment_date, appointment_time, id);
+CREATE INDEX idx_appointments_client_date_time_id ON appointments(client_id, appointment_date, appointment_time, id);
+CREATE INDEX idx_appointments_updated_at_id ON appointments(updated_at, id);
 CREATE INDEX idx_notifications_user ON notifications(user_id);
 CREATE INDEX idx_notifications_status ON notifications(status);
 CREATE INDEX idx_pets_owner ON pets(owner_id);
+CREATE INDEX idx_users_role_id ON users(role, id);
 
--- Trigger para actualizar updated_at
+-- Trigger para actualizar updated_at: inicio de la transacción en UTC, como datetime.utcnow() en los servicios
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
 BEGIN
-    NEW.updated_at = CURRENT_TIMESTAMP;
+    NEW.updated_at = now() AT TIME ZONE 'UTC';
     RETURN NEW;
 END;
 $$ language 'plpgsql';
@@ -95,7 +100,8 @@ CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
 CREATE TRIGGER update_pets_updated_at BEFORE UPDATE ON pets
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
-CREATE TRIGGER update_appointments_updated_at BEFORE UPDATE ON appointments
+-- También en INSERT: el feed de cambios necesita que todo updated_at de citas venga del reloj de la base de datos
+CREATE TRIGGER update_appointments_updated_at BEFORE INSERT OR UPDATE ON appointments
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 -- Datos de ejemplo
@@ -168,4 +174,89 @@ ON CONFLICT (setting_name) DO NOTHING;
 -- Crear un usuario administrador por defecto
 INSERT INTO users (email, password, first_name, last_name, phone, role, is_active) VALUES
 ('admin@veterinary.com', '$2b$12$1s/qCzKhHguJW.CQYyyJzugL0YROHjD97Ot0v63YJuIF2fQrSWmPG', 'Admin', 'Sistema', '555-ADMIN', 'admin', TRUE)
-ON CONFLICT (email) DO NOTHING;
\ No newline at end of file
+ON CONFLICT (email) DO NOTHING;
+
+-- Contadores de usuarios por rol y estado, mantenidos por auth-service (USER_COUNTERS_ENABLED)
+CREATE TABLE IF NOT EXISTS user_role_counters (
+    role VARCHAR(50) NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    user_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (role, is_active)
+);
+
+INSERT INTO user_role_counters (role, is_active, user_count)
+SELECT role, COALESCE(is_active, TRUE), COUNT(*) FROM users GROUP BY role, COALESCE(is_active, TRUE)
+ON CONFLICT (role, is_active) DO UPDATE SET user_count = EXCLUDED.user_count;
+
+-- Búsqueda de clientes por nombre, email y teléfono (trigramas)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm ON users
+    USING gin ((first_name || ' ' || last_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users
+    USING gin (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_phone_digits_trgm ON users
+    USING gin (regexp_replace(phone, '[^0-9]', '', 'g') gin_trgm_ops);
+
+-- Evitar citas solapadas del mismo veterinario a nivel de base de datos.
+-- Sustituye a UNIQUE(veterinarian_id, appointment_date, appointment_time), que solo
+-- detectaba coincidencias exactas de inicio e impedía reutilizar huecos cancelados.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+DO $$
+DECLARE
+    unique_name TEXT;
+BEGIN
+    -- El nombre generado para la restricción UNIQUE se trunca a 63 caracteres
+    SELECT conname INTO unique_name FROM pg_constraint
+    WHERE conrelid = 'appointments'::regclass AND contype = 'u';
+    IF unique_name IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE appointments DROP CONSTRAINT %I', unique_name);
+    END IF;
+END $$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'appointments'::regclass AND conname = 'appointments_no_overlap'
+    ) THEN
+        ALTER TABLE appointments ADD CONSTRAINT appointments_no_overlap EXCLUDE USING gist (
+            veterinarian_id WITH =,
+            tsrange(
+                appointment_date + appointment_time,
+                appointment_date + appointment_time + COALESCE(duration_minutes, 30) * INTERVAL '1 minute'
+            ) WITH &&
+        ) WHERE (status <> 'cancelled');
+    END IF;
+END $$;
+
+-- Resumen diario de citas por veterinario y estado (panel de administración)
+CREATE TABLE IF NOT EXISTS appointment_daily_rollup (
+    day DATE NOT NULL,
+    veterinarian_id INTEGER NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    appointment_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, veterinarian_id, status)
+);
+
+INSERT INTO appointment_daily_rollup (day, veterinarian_id, status, appointment_count)
+SELECT appointment_date, veterinarian_id, COALESCE(status, 'scheduled'), COUNT(*)
+FROM appointments
+GROUP BY appointment_date, veterinarian_id, COALESCE(status, 'scheduled')
+ON CONFLICT (day, veterinarian_id, status) DO UPDATE SET appointment_count = EXCLUDED.appointment_count;
+
+-- Ocupación por veterinario y día: citas activas (no canceladas), para aplicar max_appointments
+CREATE TABLE IF NOT EXISTS vet_day_occupancy (
+    veterinarian_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    booked_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (veterinarian_id, day)
+);
+
+INSERT INTO vet_day_occupancy (veterinarian_id, day, booked_count)
+SELECT veterinarian_id, appointment_date, COUNT(*)
+FROM appointments
+WHERE status <> 'cancelled'
+GROUP BY veterinarian_id, appointment_date
+ON CONFLICT (veterinarian_id, day) DO UPDATE SET booked_count = EXCLUDED.booked_count;
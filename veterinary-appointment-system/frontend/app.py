@@ -19,6 +19,23 @@ APPOINTMENT_SERVICE_URL = os.getenv('APPOINTMENT_SERVICE_URL', 'http://appointme
 NOTIFICATION_SERVICE_URL = os.getenv('NOTIFICATION_SERVICE_URL', 'http://notification-service:5003')
 
 
+# GET /appointments devuelve páginas por cursor; estas vistas necesitan el listado completo
+def fetch_all_appointments(headers, **params):
+    params['limit'] = 500
+    appointments = []
+    while True:
+        response = requests.get(f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments',
+                                params=params, headers=headers)
+        if response.status_code != 200:
+            return appointments
+
+        data = response.json()
+        appointments.extend(data.get('appointments', []))
+        if not data.get('has_more') or not data.get('next_cursor'):
+            return appointments
+        params['cursor'] = data['next_cursor']
+
+
 # Decorador para rutas protegidas
 def login_required(f):
     @wraps(f)
@@ -96,17 +113,9 @@ def dashboard():
 
     # Obtener citas del usuario
     if user['role'] == 'client':
-        response = requests.get(
-            f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?client_id={user["id"]}',
-            headers=headers
-        )
+        appointments = fetch_all_appointments(headers, client_id=user['id'])
     else:  # veterinarian
-        response = requests.get(
-            f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?veterinarian_id={user["id"]}',
-            headers=headers
-        )
-
-    appointments = response.json().get('appointments', []) if response.status_code == 200 else []
+        appointments = fetch_all_appointments(headers, veterinarian_id=user['id'])
 
     # Obtener notificaciones
     notif_response = requests.get(
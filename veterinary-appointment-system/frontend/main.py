@@ -5,7 +5,8 @@ from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, render_template, redirect, url_for, request, session, flash, jsonify, make_response
+from flask import Flask, render_template, redirect, url_for, request, session, flash, jsonify, make_response, \
+    Response, stream_with_context
 import requests
 import os
 from dotenv import load_dotenv
@@ -25,6 +26,44 @@ APPOINTMENT_SERVICE_URL = 'http://localhost:5002'
 NOTIFICATION_SERVICE_URL = 'http://localhost:5003'
 
 
+# Copia local del directorio de veterinarios, revalidada con ETag
+_veterinarians_cache = {'etag': None, 'veterinarians': []}
+
+
+def fetch_veterinarians():
+    headers = {}
+    if _veterinarians_cache['etag']:
+        headers['If-None-Match'] = _veterinarians_cache['etag']
+
+    response = requests.get(f'{AUTH_SERVICE_URL}/api/auth/veterinarians', headers=headers)
+
+    if response.status_code == 304:
+        return _veterinarians_cache['veterinarians']
+    if response.status_code != 200:
+        return []
+
+    _veterinarians_cache['veterinarians'] = response.json().get('veterinarians', [])
+    _veterinarians_cache['etag'] = response.headers.get('ETag')
+    return _veterinarians_cache['veterinarians']
+
+
+# GET /appointments devuelve páginas por cursor; estas vistas necesitan el listado completo
+def fetch_all_appointments(headers, **params):
+    params['limit'] = 500
+    appointments = []
+    while True:
+        response = requests.get(f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments',
+                                params=params, headers=headers)
+        if response.status_code != 200:
+            return appointments
+
+        data = response.json()
+        appointments.extend(data.get('appointments', []))
+        if not data.get('has_more') or not data.get('next_cursor'):
+            return appointments
+        params['cursor'] = data['next_cursor']
+
+
 # Decorador para rutas protegidas
 def login_required(f):
     @wraps(f)
@@ -158,17 +197,9 @@ def dashboard():
     headers = {'Authorization': f'Bearer {session["token"]}'}
 
     if user['role'] == 'client':
-        response = requests.get(
-            f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?client_id={user["id"]}',
-            headers=headers
-        )
+        appointments = fetch_all_appointments(headers, client_id=user['id'])
     else:
-        response = requests.get(
-            f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?veterinarian_id={user["id"]}',
-            headers=headers
-        )
-
-    appointments = response.json().get('appointments', []) if response.status_code == 200 else []
+        appointments = fetch_all_appointments(headers, veterinarian_id=user['id'])
 
     notif_response = requests.get(
         f'{NOTIFICATION_SERVICE_URL}/api/notifications/notifications/{user["id"]}?status=pending',
@@ -207,6 +238,27 @@ def new_appointment():
         if response.status_code == 201:
             appointment = response.json()['appointment']
 
+            # Resolver los nombres del veterinario y de la mascota para el correo de confirmación
+            veterinarian_name = 'Dr. Veterinario'
+            users_response = requests.get(
+                f'{AUTH_SERVICE_URL}/api/auth/users',
+                params={'ids': appointment['veterinarian_id']},
+                headers=headers
+            )
+            if users_response.status_code == 200:
+                for vet in users_response.json().get('users', []):
+                    veterinarian_name = f"{vet['first_name']} {vet['last_name']}"
+
+            pet_name = 'Mascota'
+            pets_response = requests.get(
+                f'{APPOINTMENT_SERVICE_URL}/api/appointments/pets/{user["id"]}',
+                headers=headers
+            )
+            if pets_response.status_code == 200:
+                for pet in pets_response.json().get('pets', []):
+                    if pet['id'] == appointment['pet_id']:
+                        pet_name = pet['name']
+
             requests.post(f'{NOTIFICATION_SERVICE_URL}/api/notifications/send-email', json={
                 'type': 'appointment_confirmation',
                 'recipient_email': user['email'],
@@ -216,8 +268,8 @@ def new_appointment():
                     'client_name': f"{user['first_name']} {user['last_name']}",
                     'date': appointment['appointment_date'],
                     'time': appointment['appointment_time'],
-                    'veterinarian_name': 'Dr. Veterinario',
-                    'pet_name': 'Mascota',
+                    'veterinarian_name': veterinarian_name,
+                    'pet_name': pet_name,
                     'reason': appointment['reason']
                 }
             })
@@ -227,8 +279,7 @@ def new_appointment():
         else:
             flash('Error al agendar la cita', 'danger')
 
-    vet_response = requests.get(f'{AUTH_SERVICE_URL}/api/auth/veterinarians')
-    veterinarians = vet_response.json().get('veterinarians', []) if vet_response.status_code == 200 else []
+    veterinarians = fetch_veterinarians()
 
     pets_response = requests.get(
         f'{APPOINTMENT_SERVICE_URL}/api/appointments/pets/{user["id"]}',
@@ -335,6 +386,106 @@ def get_available_slots_proxy(veterinarian_id):
         return jsonify({'error': 'Error al obtener horarios disponibles'}), 500
 
 
+@app.route('/api/appointments/availability/<int:veterinarian_id>/fully-booked')
+@login_required
+def get_fully_booked_days_proxy(veterinarian_id):
+    try:
+        response = requests.get(
+            f'{APPOINTMENT_SERVICE_URL}/api/appointments/availability/{veterinarian_id}/fully-booked',
+            params=request.args
+        )
+        return response.json(), response.status_code
+    except Exception as e:
+        app.logger.error(f"Error getting fully booked days: {str(e)}")
+        return jsonify({'error': 'Error al obtener los días completos'}), 500
+
+
+@app.route('/api/appointments/stream')
+@login_required
+def stream_appointments_proxy():
+    """Reenvía el stream SSE de citas; EventSource no puede enviar la cabecera Authorization"""
+    token = session.get('token')
+
+    if not token:
+        return jsonify({'error': 'No hay sesión activa'}), 401
+
+    try:
+        upstream = requests.get(
+            f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments/stream',
+            params=request.args,
+            headers={'Authorization': f'Bearer {token}'},
+            stream=True,
+            timeout=(5, None)
+        )
+    except Exception as e:
+        app.logger.error(f"Error opening appointment stream: {str(e)}")
+        return jsonify({'error': 'Error al conectar con el servicio de citas'}), 502
+
+    if upstream.status_code != 200:
+        upstream.close()
+        return jsonify({'error': 'Error al conectar con el servicio de citas'}), upstream.status_code
+
+    def relay():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            upstream.close()
+
+    response = Response(stream_with_context(relay()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/appointments/clients/summary')
+@login_required
+def get_clients_summary_proxy():
+    token = session.get('token')
+
+    if not token:
+        return jsonify({'error': 'No hay sesión activa'}), 401
+
+    headers = {
+        'Authorization': f'Bearer {token}'
+    }
+
+    try:
+        response = requests.get(
+            f'{APPOINTMENT_SERVICE_URL}/api/appointments/clients/summary',
+            params=request.args,
+            headers=headers
+        )
+        return response.json(), response.status_code
+    except Exception as e:
+        app.logger.error(f"Error getting clients summary: {str(e)}")
+        return jsonify({'error': 'Error al obtener el resumen de clientes'}), 500
+
+
+@app.route('/api/appointments/calendar')
+@login_required
+def get_calendar_proxy():
+    token = session.get('token')
+
+    if not token:
+        return jsonify({'error': 'No hay sesión activa'}), 401
+
+    headers = {
+        'Authorization': f'Bearer {token}'
+    }
+
+    try:
+        response = requests.get(
+            f'{APPOINTMENT_SERVICE_URL}/api/appointments/calendar',
+            params=request.args,
+            headers=headers
+        )
+        return response.json(), response.status_code
+    except Exception as e:
+        app.logger.error(f"Error getting calendar: {str(e)}")
+        return jsonify({'error': 'Error al obtener el calendario'}), 500
+
+
 #
 # PANEL DE ADMINISTRADOR
 #
@@ -382,6 +533,24 @@ def admin_dashboard_stats():
         }), 200
 
 
+@app.route('/api/admin/clients/search')
+@login_required
+def admin_client_search():
+    """Búsqueda de clientes (administradores y recepcionistas)"""
+    user = session.get('user')
+
+    if user['role'] not in ('admin', 'receptionist'):
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+
+    headers = {'Authorization': f'Bearer {session["token"]}'}
+    try:
+        response = requests.get(f'{AUTH_SERVICE_URL}/api/admin/clients/search', headers=headers, params=request.args)
+        return response.json(), response.status_code
+    except Exception as e:
+        app.logger.error(f"Error buscando clientes: {str(e)}")
+        return jsonify({'error': 'Error de comunicación con el servicio'}), 500
+
+
 @app.route('/api/admin/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 @login_required
 def admin_api_proxy(path):
@@ -658,20 +827,11 @@ def vet_dashboard():
 
     # Obtener citas del día para este veterinario
     today = datetime.now().strftime('%Y-%m-%d')
-    response = requests.get(
-        f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?veterinarian_id={user["id"]}&date_from={today}&date_to={today}',
-        headers=headers
-    )
+    today_appointments = fetch_all_appointments(headers, veterinarian_id=user['id'], date_from=today, date_to=today)
 
-    today_appointments = response.json().get('appointments', []) if response.status_code == 200 else []
-
-    # Obtener todas las citas pendientes
-    response = requests.get(
-        f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?veterinarian_id={user["id"]}&status=scheduled',
-        headers=headers
-    )
-
-    upcoming_appointments = response.json().get('appointments', []) if response.status_code == 200 else []
+    # Obtener las próximas citas pendientes (desde hoy)
+    upcoming_appointments = fetch_all_appointments(headers, veterinarian_id=user['id'], status='scheduled',
+                                                   date_from=today)
 
     # Obtener horario del veterinario
     response = requests.get(
@@ -713,16 +873,10 @@ def receptionist_dashboard():
 
     # Obtener citas del día
     today = datetime.now().strftime('%Y-%m-%d')
-    response = requests.get(
-        f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?date_from={today}&date_to={today}',
-        headers=headers
-    )
-
-    today_appointments = response.json().get('appointments', []) if response.status_code == 200 else []
+    today_appointments = fetch_all_appointments(headers, date_from=today, date_to=today)
 
     # Obtener lista de veterinarios disponibles hoy
-    response = requests.get(f'{AUTH_SERVICE_URL}/api/auth/veterinarians', headers=headers)
-    veterinarians = response.json().get('veterinarians', []) if response.status_code == 200 else []
+    veterinarians = fetch_veterinarians()
 
     # Obtener notificaciones
     notif_response = requests.get(
@@ -755,12 +909,7 @@ def assistant_dashboard():
 
     # Obtener citas del día
     today = datetime.now().strftime('%Y-%m-%d')
-    response = requests.get(
-        f'{APPOINTMENT_SERVICE_URL}/api/appointments/appointments?date_from={today}&date_to={today}',
-        headers=headers
-    )
-
-    today_appointments = response.json().get('appointments', []) if response.status_code == 200 else []
+    today_appointments = fetch_all_appointments(headers, date_from=today, date_to=today)
 
     # Obtener lista de tareas pendientes (simulado, esto requeriría un nuevo servicio de tareas)
     tasks = [
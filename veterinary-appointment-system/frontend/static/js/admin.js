@@ -1,10 +1,18 @@
 // admin.js - Funcionalidades para el panel de administrador
 
+// Tamaño de página del listado de clientes
+const CLIENTS_PAGE_SIZE = 100;
+// Máximo de ids que acepta /clients/summary por petición (MAX_OWNER_IDS)
+const CLIENT_SUMMARY_CHUNK_SIZE = 500;
+
 // Variables globales
 let staffList = [];
 let clientsList = [];
 let currentStaffSchedules = {};
 let currentClientId = null;
+let clientsFromSearch = false;
+let clientsNextCursor = null;
+let clientSearchTimer = null;
 let systemSettings = {};
 
 // Inicialización
@@ -107,13 +115,10 @@ function loadStaffList() {
         }
     }
 
-    fetch(url, { headers })
-        .then(response => response.json())
-        .then(data => {
-            if (data.staff) {
-                staffList = data.staff;
-                renderStaffTable();
-            }
+    fetchAllPages(url, 'staff', headers)
+        .then(staff => {
+            staffList = staff;
+            renderStaffTable();
         })
         .catch(error => console.error('Error loading staff list:', error));
 }
@@ -331,30 +336,60 @@ function toggleSpecializationField() {
 
 // ===== CLIENTES =====
 
-// Cargar lista de clientes
-function loadClientsList() {
+// Cargar lista de clientes (append = true añade la página siguiente a la ya mostrada)
+function loadClientsList(append = false) {
     const headers = {
         'Authorization': `Bearer ${getAuthToken()}`
     };
 
     const statusFilter = document.getElementById('client-status-filter').value;
+    const searchText = document.getElementById('client-search').value.trim();
 
-    let url = '/api/admin/clients';
+    // Con texto de búsqueda el filtrado se hace en el servidor
+    const params = new URLSearchParams();
     if (statusFilter) {
-        url += `?is_active=${statusFilter}`;
+        params.append('is_active', statusFilter);
+    }
+
+    // La búsqueda ya devuelve un número acotado de resultados; el listado va página a página
+    const fromSearch = searchText.length >= 2;
+
+    let url = '/api/admin/clients';
+    if (fromSearch) {
+        url = '/api/admin/clients/search';
+        params.append('q', searchText);
+    } else {
+        params.append('limit', CLIENTS_PAGE_SIZE);
+        params.append('count', 'false');
+        if (append && clientsNextCursor) {
+            params.append('cursor', clientsNextCursor);
+        }
     }
 
-    fetch(url, { headers })
+    fetch(`${url}?${params.toString()}`, { headers })
         .then(response => response.json())
         .then(data => {
-            if (data.clients) {
-                clientsList = data.clients;
-                renderClientsTable();
+            if (!data.clients) {
+                throw new Error(data.error || 'Respuesta sin clients');
             }
+
+            clientsNextCursor = !fromSearch && data.has_more ? data.next_cursor : null;
+            clientsFromSearch = fromSearch;
+            clientsList = append ? clientsList.concat(data.clients) : data.clients;
+
+            renderClientsTable(data.clients, append);
+            document.getElementById('clients-load-more').style.display = clientsNextCursor ? '' : 'none';
         })
         .catch(error => console.error('Error loading clients list:', error));
 }
 
+// Cargar la página siguiente del listado de clientes
+function loadMoreClients() {
+    if (clientsNextCursor) {
+        loadClientsList(true);
+    }
+}
+
 // Cargar estadísticas de clientes
 function loadClientsStats() {
     const headers = {
@@ -375,106 +410,126 @@ function loadClientsStats() {
         .catch(error => console.error('Error loading client stats:', error));
 }
 
-// Renderizar tabla de clientes
-function renderClientsTable() {
+// Renderizar tabla de clientes: una página de resultados, que se añade a la tabla si append es true
+function renderClientsTable(clients = clientsList, append = false) {
     const tableBody = document.getElementById('clients-table-body');
     const searchText = document.getElementById('client-search').value.toLowerCase();
 
-    tableBody.innerHTML = '';
+    if (!append) {
+        tableBody.innerHTML = '';
+    }
 
-    const filteredClients = clientsList.filter(client => {
+    const filteredClients = clientsFromSearch ? clients : clients.filter(client => {
         const fullName = `${client.first_name} ${client.last_name}`.toLowerCase();
         const email = client.email.toLowerCase();
         return fullName.includes(searchText) || email.includes(searchText);
     });
 
     if (filteredClients.length === 0) {
-        tableBody.innerHTML = '<tr><td colspan="7" class="text-center">No se encontraron resultados</td></tr>';
+        if (!append) {
+            tableBody.innerHTML = '<tr><td colspan="7" class="text-center">No se encontraron resultados</td></tr>';
+        }
         return;
     }
 
-    filteredClients.forEach(client => {
-        // Obtener el conteo de mascotas y citas (datos simulados aquí)
-        fetch(`/api/appointments/pets/${client.id}`, {
-            headers: {
-                'Authorization': `Bearer ${getAuthToken()}`
+    // Conteo de mascotas y citas de los clientes de esta página; si falla se muestra "?" en lugar de 0
+    fetchClientSummaries(filteredClients.map(client => client.id))
+    .catch(error => {
+        console.error('Error loading clients summary:', error);
+        return null;
+    })
+    .then(summaries => {
+        filteredClients.forEach(client => {
+            const summary = summaries ? summaries[client.id] || {} : null;
+            const petCount = summary ? summary.pet_count || 0 : '?';
+            const appointmentCount = summary ? summary.appointment_count || 0 : '?';
+
+            const row = document.createElement('tr');
+
+            const nameCell = document.createElement('td');
+            nameCell.textContent = `${client.first_name} ${client.last_name}`;
+
+            const emailCell = document.createElement('td');
+            emailCell.textContent = client.email;
+
+            const phoneCell = document.createElement('td');
+            phoneCell.textContent = client.phone || 'N/A';
+
+            const petsCell = document.createElement('td');
+            petsCell.textContent = petCount;
+
+            const appointmentsCell = document.createElement('td');
+            appointmentsCell.textContent = appointmentCount;
+
+            const statusCell = document.createElement('td');
+            const statusBadge = document.createElement('span');
+            statusBadge.classList.add('status-badge');
+            statusBadge.classList.add(client.is_active ? 'status-active' : 'status-inactive');
+            statusBadge.textContent = client.is_active ? 'Activo' : 'Inactivo';
+            statusCell.appendChild(statusBadge);
+
+            const actionsCell = document.createElement('td');
+            const viewButton = document.createElement('button');
+            viewButton.classList.add('btn', 'btn-sm', 'btn-info', 'mr-1');
+            viewButton.textContent = 'Ver Detalles';
+            viewButton.onclick = () => viewClientDetails(client.id);
+
+            const toggleButton = document.createElement('button');
+            toggleButton.classList.add('btn', 'btn-sm');
+            if (client.is_active) {
+                toggleButton.classList.add('btn-danger');
+                toggleButton.textContent = 'Desactivar';
+            } else {
+                toggleButton.classList.add('btn-success');
+                toggleButton.textContent = 'Activar';
             }
-        })
-        .then(response => response.json())
-        .then(petsData => {
-            // Obtener citas
-            fetch(`/api/appointments/appointments?client_id=${client.id}`, {
-                headers: {
-                    'Authorization': `Bearer ${getAuthToken()}`
-                }
-            })
-            .then(response => response.json())
-            .then(appointmentsData => {
-                const petCount = petsData.pets ? petsData.pets.length : 0;
-                const appointmentCount = appointmentsData.appointments ? appointmentsData.appointments.length : 0;
-
-                const row = document.createElement('tr');
-
-                const nameCell = document.createElement('td');
-                nameCell.textContent = `${client.first_name} ${client.last_name}`;
-
-                const emailCell = document.createElement('td');
-                emailCell.textContent = client.email;
-
-                const phoneCell = document.createElement('td');
-                phoneCell.textContent = client.phone || 'N/A';
-
-                const petsCell = document.createElement('td');
-                petsCell.textContent = petCount;
-
-                const appointmentsCell = document.createElement('td');
-                appointmentsCell.textContent = appointmentCount;
-
-                const statusCell = document.createElement('td');
-                const statusBadge = document.createElement('span');
-                statusBadge.classList.add('status-badge');
-                statusBadge.classList.add(client.is_active ? 'status-active' : 'status-inactive');
-                statusBadge.textContent = client.is_active ? 'Activo' : 'Inactivo';
-                statusCell.appendChild(statusBadge);
-
-                const actionsCell = document.createElement('td');
-                const viewButton = document.createElement('button');
-                viewButton.classList.add('btn', 'btn-sm', 'btn-info', 'mr-1');
-                viewButton.textContent = 'Ver Detalles';
-                viewButton.onclick = () => viewClientDetails(client.id);
-
-                const toggleButton = document.createElement('button');
-                toggleButton.classList.add('btn', 'btn-sm');
-                if (client.is_active) {
-                    toggleButton.classList.add('btn-danger');
-                    toggleButton.textContent = 'Desactivar';
-                } else {
-                    toggleButton.classList.add('btn-success');
-                    toggleButton.textContent = 'Activar';
-                }
-                toggleButton.onclick = () => toggleClientStatus(client.id, !client.is_active);
+            toggleButton.onclick = () => toggleClientStatus(client.id, !client.is_active);
 
-                actionsCell.appendChild(viewButton);
-                actionsCell.appendChild(document.createTextNode(' '));
-                actionsCell.appendChild(toggleButton);
+            actionsCell.appendChild(viewButton);
+            actionsCell.appendChild(document.createTextNode(' '));
+            actionsCell.appendChild(toggleButton);
 
-                row.appendChild(nameCell);
-                row.appendChild(emailCell);
-                row.appendChild(phoneCell);
-                row.appendChild(petsCell);
-                row.appendChild(appointmentsCell);
-                row.appendChild(statusCell);
-                row.appendChild(actionsCell);
+            row.appendChild(nameCell);
+            row.appendChild(emailCell);
+            row.appendChild(phoneCell);
+            row.appendChild(petsCell);
+            row.appendChild(appointmentsCell);
+            row.appendChild(statusCell);
+            row.appendChild(actionsCell);
 
-                tableBody.appendChild(row);
-            });
+            tableBody.appendChild(row);
         });
     });
 }
 
+// Resúmenes de varios clientes, en bloques de como máximo CLIENT_SUMMARY_CHUNK_SIZE ids
+function fetchClientSummaries(ids) {
+    const chunks = [];
+    for (let i = 0; i < ids.length; i += CLIENT_SUMMARY_CHUNK_SIZE) {
+        chunks.push(ids.slice(i, i + CLIENT_SUMMARY_CHUNK_SIZE));
+    }
+
+    return Promise.all(chunks.map(chunk =>
+        fetch(`/api/appointments/clients/summary?ids=${chunk.join(',')}`, {
+            headers: {
+                'Authorization': `Bearer ${getAuthToken()}`
+            }
+        })
+        .then(response => response.json().then(data => {
+            if (!response.ok) {
+                throw new Error(data.error || `HTTP ${response.status}`);
+            }
+            return data.summaries;
+        }))
+    ))
+    .then(results => Object.assign({}, ...results));
+}
+
 // Filtrar clientes
 function filterClients() {
-    loadClientsList();
+    // Esperar a que el usuario deje de escribir antes de consultar al servidor
+    clearTimeout(clientSearchTimer);
+    clientSearchTimer = setTimeout(loadClientsList, 300);
 }
 
 // Ver detalles del cliente
@@ -560,14 +615,14 @@ function loadClientAppointments(clientId) {
     const appointmentsList = document.getElementById('client-appointments-list');
     appointmentsList.innerHTML = '<p class="loading">Cargando historial de citas...</p>';
 
-    fetch(`/api/appointments/appointments?client_id=${clientId}`, {
-        headers: {
-            'Authorization': `Bearer ${getAuthToken()}`
-        }
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (!data.appointments || data.appointments.length === 0) {
+    const headers = {
+        'Authorization': `Bearer ${getAuthToken()}`
+    };
+
+    // El historial se pide completo: el listado de citas devuelve páginas por cursor
+    fetchAllPages(`/api/appointments/appointments?client_id=${clientId}`, 'appointments', headers)
+    .then(appointments => {
+        if (appointments.length === 0) {
             appointmentsList.innerHTML = '<p class="no-data">El cliente no tiene citas registradas</p>';
             return;
         }
@@ -575,7 +630,7 @@ function loadClientAppointments(clientId) {
         appointmentsList.innerHTML = '';
 
         // Ordenar citas por fecha (más recientes primero)
-        const sortedAppointments = data.appointments.sort((a, b) => {
+        const sortedAppointments = appointments.sort((a, b) => {
             return new Date(b.appointment_date) - new Date(a.appointment_date);
         });
 
@@ -672,15 +727,12 @@ function loadStaffForSchedules() {
         'Authorization': `Bearer ${getAuthToken()}`
     };
 
-    fetch('/api/admin/staff?role=veterinarian&is_active=true', { headers })
-        .then(response => response.json())
-        .then(data => {
-            if (!data.staff) return;
-
+    fetchAllPages('/api/admin/staff?role=veterinarian&is_active=true', 'staff', headers)
+        .then(staffMembers => {
             const selectElement = document.getElementById('schedule-staff-filter');
             selectElement.innerHTML = '<option value="">Seleccione un miembro del personal</option>';
 
-            data.staff.forEach(staff => {
+            staffMembers.forEach(staff => {
                 const option = document.createElement('option');
                 option.value = staff.id;
                 option.textContent = `${staff.first_name} ${staff.last_name} - ${staff.specialization || 'Sin especialidad'}`;
@@ -916,15 +968,12 @@ function loadStaffForCopy() {
         'Authorization': `Bearer ${getAuthToken()}`
     };
 
-    fetch('/api/admin/staff?is_active=true', { headers })
-        .then(response => response.json())
-        .then(data => {
-            if (!data.staff) return;
-
+    fetchAllPages('/api/admin/staff?is_active=true', 'staff', headers)
+        .then(staffMembers => {
             const selectElement = document.getElementById('copy-target-staff');
             selectElement.innerHTML = '';
 
-            data.staff.forEach(staff => {
+            staffMembers.forEach(staff => {
                 // No incluir al personal de origen en la lista
                 if (staff.id.toString() === sourceStaffId) return;
 
@@ -1186,6 +1235,25 @@ function getAuthToken() {
     return localStorage.getItem('authToken') || sessionStorage.getItem('authToken') || '';
 }
 
+// Recorre todas las páginas de un listado paginado por cursor siguiendo next_cursor
+function fetchAllPages(url, collectionName, headers, cursor = null, items = []) {
+    const separator = url.includes('?') ? '&' : '?';
+    const pageUrl = `${url}${separator}limit=500&count=false${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`;
+
+    return fetch(pageUrl, { headers })
+        .then(response => response.json())
+        .then(data => {
+            if (!data[collectionName]) {
+                throw new Error(data.error || `Respuesta sin ${collectionName}`);
+            }
+            const collected = items.concat(data[collectionName]);
+            if (data.has_more && data.next_cursor) {
+                return fetchAllPages(url, collectionName, headers, data.next_cursor, collected);
+            }
+            return collected;
+        });
+}
+
 // Formatear fecha
 function formatDate(dateStr) {
     if (!dateStr) return 'N/A';